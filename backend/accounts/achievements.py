@@ -0,0 +1,159 @@
+"""Declarative rules for awarding ``UserAchievement``s.
+
+Each rule is a condition on an annotated ``User`` queryset, so checking a
+rule for everyone is one set-based query, and checking it for one user
+is the same query narrowed to that user. New achievements are inserted
+with ``bulk_create(ignore_conflicts=True)``, so the ``(user,
+achievement_type)`` unique key makes repeated or concurrent evaluation
+harmless.
+
+Rules name the events that can change their outcome. A signal only
+re-checks the rules for its event, on the background pool after commit.
+"""
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from baltic_climate import background
+
+from .activity import forget_activity_stats
+from .models import User, UserAchievement
+
+JOINED = "joined"
+ORGANIZED = "organized"
+
+ACHIEVEMENT_NAMES = dict(UserAchievement.ACHIEVEMENT_TYPES)
+
+
+def per_user(queryset, user_field, aggregate):
+    """Correlated subquery aggregating ``queryset`` for the outer user"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{user_field: OuterRef("pk")})
+            .order_by()
+            .values(user_field)
+            .annotate(total=aggregate)
+            .values("total")
+        ),
+        0,
+    )
+
+
+def joined_of_type(*action_types):
+    from actions.models import ActionParticipation
+    
+    participations = ActionParticipation.objects.filter(action__action_type__in=action_types).exclude(
+        participation_type="cancelled"
+    )
+    return per_user(participations, "user", Count("pk"))
+
+
+def organized_of_type(*action_types):
+    from actions.models import ClimateAction
+    
+    return per_user(ClimateAction.objects.filter(action_type__in=action_types), "organizer", Count("pk"))
+
+
+def participants_reached():
+    from actions.models import ClimateAction
+    
+    return per_user(ClimateAction.objects.all(), "organizer", Sum("participant_count"))
+
+
+class Rule:
+    """Award ``achievement_type`` to users matching ``condition``.
+    
+    ``annotations`` are callables returning the expressions that
+    ``condition`` refers to; ``events`` are those that may make it true.
+    """
+    
+    def __init__(self, achievement_type, description, icon, condition, events, **annotations):
+        self.achievement_type = achievement_type
+        self.name = ACHIEVEMENT_NAMES[achievement_type]
+        self.description = description
+        self.icon = icon
+        self.condition = condition
+        self.events = frozenset(events)
+        self.annotations = annotations
+    
+    def candidates(self, user_ids=None):
+        """Ids of the users who meet the condition but do not have the achievement yet"""
+        users = User.objects.filter(is_active=True)
+        if user_ids is not None:
+            users = users.filter(pk__in=user_ids)
+        users = users.exclude(achievements__achievement_type=self.achievement_type)
+        if self.annotations:
+            users = users.annotate(**{name: expression() for name, expression in self.annotations.items()})
+        return users.filter(self.condition).values_list("pk", flat=True)
+    
+    def award(self, user_ids=None):
+        """Award everyone eligible and return how many users qualified"""
+        candidates = list(self.candidates(user_ids))
+        UserAchievement.objects.bulk_create(
+            [
+                UserAchievement(
+                    user_id=user_id,
+                    achievement_type=self.achievement_type,
+                    name=self.name,
+                    description=self.description,
+                    icon=self.icon,
+                )
+                for user_id in candidates
+            ],
+            ignore_conflicts=True,
+        )
+        for user_id in candidates:
+            forget_activity_stats(user_id)
+        return len(candidates)
+
+
+RULES = [
+    Rule(
+        "organizer", "Organized a first climate action.", "📣",
+        Q(actions_organized__gte=1), [ORGANIZED],
+    ),
+    Rule(
+        "community_builder", "Brought 25 participants to actions you organized.", "🤝",
+        Q(reached__gte=25), [ORGANIZED, JOINED],
+        reached=participants_reached,
+    ),
+    Rule(
+        "citizen_scientist", "Joined 3 citizen science actions.", "🔬",
+        Q(science__gte=3), [JOINED],
+        science=lambda: joined_of_type("citizen_science"),
+    ),
+    Rule(
+        "advocate", "Joined 3 assemblies, budgeting rounds or protests.", "📢",
+        Q(advocacy__gte=3), [JOINED],
+        advocacy=lambda: joined_of_type("climate_assembly", "participatory_budgeting", "protest"),
+    ),
+    Rule(
+        "mentor", "Organized 3 workshops or seminars.", "🎓",
+        Q(teaching__gte=3), [ORGANIZED],
+        teaching=lambda: organized_of_type("workshop", "seminar"),
+    ),
+    Rule(
+        "climate_champion", "Reached an impact score of 100.", "🏆",
+        Q(impact_score__gte=100), [JOINED, ORGANIZED],
+    ),
+]
+
+
+def evaluate_achievements(user_ids=None, event=None):
+    """Check the rules for ``event`` (all rules if None) and award new achievements.
+    
+    Covers ``user_ids`` or every user. Returns how many users qualified for
+    each achievement type.
+    """
+    return {
+        rule.achievement_type: rule.award(user_ids)
+        for rule in RULES
+        if event is None or event in rule.events
+    }
+
+
+def queue_achievement_check(user_ids, event):
+    """Re-check ``event``'s rules for ``user_ids`` once the transaction commits"""
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: background.submit(evaluate_achievements, user_ids, event))
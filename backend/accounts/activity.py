@@ -0,0 +1,120 @@
+"""Contribution graph storage and its compact, cached encoding."""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from baltic_climate.cache import bump_version, versioned_key
+from .models import UserAchievement, UserActivity
+
+GRAPH_DAYS = 366
+SUMMARY_MONTHS = 12
+
+
+def activity_namespace(user_id):
+    return f"activity:{user_id}"
+
+
+def forget_activity_stats(user_id):
+    """Drop the user's cached graphs and stats"""
+    bump_version(activity_namespace(user_id))
+
+
+def record_activity(user_id, date=None):
+    """Count an action for the user's contribution graph and drop cached graphs"""
+    UserActivity.record(user_id, date or timezone.localdate())
+    forget_activity_stats(user_id)
+
+
+def unrecord_activity(user_id, date):
+    """Take back an action counted by ``record_activity`` on ``date`` and drop cached graphs"""
+    UserActivity.unrecord(user_id, date)
+    forget_activity_stats(user_id)
+
+
+def contribution_graph(user_id):
+    """Last year of contribution levels as a start date and one digit per day.
+    
+    ``levels[i]`` is the 0-4 contribution level of ``start + i days``, which
+    keeps the payload at a few hundred bytes instead of 366 objects.
+    """
+    today = timezone.localdate()
+    key = versioned_key(activity_namespace(user_id), "graph", today.isoformat())
+    return cache.get_or_set(key, lambda: _build_graph(user_id, today), settings.PROFILE_CACHE_TIMEOUT)
+
+
+def _build_graph(user_id, today):
+    start = today - timedelta(days=GRAPH_DAYS - 1)
+    levels = bytearray(b"0" * GRAPH_DAYS)
+    total = 0
+    activities = UserActivity.objects.filter(user_id=user_id, date__gte=start, date__lte=today)
+    for date, action_count, level in activities.values_list("date", "action_count", "contribution_level"):
+        levels[(date - start).days] = ord("0") + level
+        total += action_count
+    return {
+        "start": start.isoformat(),
+        "end": today.isoformat(),
+        "levels": levels.decode(),
+        "total_actions": total,
+    }
+
+
+def stats_key(user_id, days, today):
+    return versioned_key(activity_namespace(user_id), "stats", days, today.isoformat())
+
+
+def stats_prefetches(today):
+    """The last GRAPH_DAYS of activity and the achievements, as bounded prefetches.
+    
+    Achievements need no limit: a user holds each type at most once.
+    """
+    return [
+        Prefetch(
+            "activities",
+            queryset=UserActivity.objects.filter(date__gt=today - timedelta(days=GRAPH_DAYS), date__lte=today),
+            to_attr="recent_activities",
+        ),
+        Prefetch("achievements", queryset=UserAchievement.objects.all(), to_attr="earned_achievements"),
+    ]
+
+
+def activity_summary(activities, today):
+    """Streaks and per-month totals over ``activities``, newest first.
+    
+    The current streak counts consecutive active days up to today, or up to
+    yesterday while today has no activity yet.
+    """
+    dates = [activity.date for activity in activities if activity.action_count]
+    longest = run = 0
+    previous = None
+    for date in reversed(dates):
+        run = run + 1 if previous is not None and (date - previous).days == 1 else 1
+        longest = max(longest, run)
+        previous = date
+    
+    current = 0
+    expected = today if dates and dates[0] == today else today - timedelta(days=1)
+    for date in dates:
+        if date != expected:
+            break
+        current += 1
+        expected -= timedelta(days=1)
+    
+    months = {}
+    year, month = today.year, today.month
+    for _ in range(SUMMARY_MONTHS):
+        months[f"{year:04d}-{month:02d}"] = 0
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    for activity in activities:
+        key = activity.date.strftime("%Y-%m")
+        if key in months:
+            months[key] += activity.action_count
+    
+    return {
+        "current_streak": current,
+        "longest_streak": longest,
+        "months": [{"month": month, "actions": total} for month, total in reversed(months.items())],
+    }
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
 
+from baltic_climate import background
+
 
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "accounts"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        
+        background.register_periodic(
+            "prune_expired_tokens", "TOKEN_BLACKLIST_PRUNE_INTERVAL", "accounts.tokens.prune_expired_tokens"
+        )
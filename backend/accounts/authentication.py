@@ -0,0 +1,58 @@
+"""JWT authentication that resolves users from the cache.
+
+``JWTAuthentication`` loads the ``User`` row on every request, which
+dominates cheap, frequently polled endpoints such as ``map-data/``.
+``CachedJWTAuthentication`` keeps the user for
+``AUTH_USER_CACHE_TIMEOUT`` seconds under a per-user cache version.
+Saving or deleting the user bumps the version (see ``accounts.signals``).
+With a cache shared between processes (Redis, Memcached), deactivation,
+permission and password changes therefore take effect at once. With the
+default LocMemCache the bump only reaches the process that saved the
+user. Other workers can keep authenticating a deactivated user, or one
+whose password changed, for up to ``AUTH_USER_CACHE_TIMEOUT`` seconds.
+Deployments with several workers should share the cache or keep the
+timeout short.
+
+Counters that are maintained with ``QuerySet.update()``
+(``actions_joined``, ``impact_score``, ...) may lag on ``request.user``
+for up to the timeout; views that return them re-read the row.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from baltic_climate.cache import bump_version, versioned_key
+
+
+def user_namespace(user_id):
+    return f"user:{user_id}"
+
+
+def forget_cached_user(user_id):
+    """Drop every cached copy of the user"""
+    bump_version(user_namespace(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+        
+        key = versioned_key(user_namespace(user_id), "auth")
+        user = cache.get(key)
+        if user is None:
+            # Raises for unknown and inactive users, so only usable users are cached
+            user = super().get_user(validated_token)
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        elif api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
@@ -0,0 +1,93 @@
+"""Coalesced writes of ``User.last_activity``.
+
+Requests only note the time in a per-process buffer. Every
+``LAST_ACTIVITY_FLUSH_INTERVAL`` seconds the next request hands the
+buffer to the background pool. The pool writes it back in one
+``UPDATE ... SET last_activity = CASE id ...`` per chunk of users, off
+the response path. A busy user costs one write per interval instead of
+one per request, which on SQLite keeps activity tracking from contending
+for the writer lock. A failed write is logged, and its times go back
+into the buffer for the next flush.
+
+``GREATEST`` keeps the stored time from moving backwards when several
+processes flush the same user. A process that exits loses at most one
+interval of last-seen times.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from baltic_climate import background
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+# Users per UPDATE, which keeps the CASE under SQLite's parameter limit
+FLUSH_CHUNK_SIZE = 400
+
+
+class LastActivityBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = {}
+        self._flushed_at = time.monotonic()
+    
+    def __len__(self):
+        return len(self._seen)
+    
+    def touch(self, user_id, when=None):
+        with self._lock:
+            self._seen[user_id] = when or timezone.now()
+    
+    def flush_if_due(self):
+        """Queue a flush on the background pool if the interval has passed; only one caller gets to"""
+        with self._lock:
+            if not self._seen or time.monotonic() - self._flushed_at < settings.LAST_ACTIVITY_FLUSH_INTERVAL:
+                return False
+            self._flushed_at = time.monotonic()
+        background.submit(self.flush)
+        return True
+    
+    def flush(self):
+        """Write every buffered time and return how many users were updated"""
+        with self._lock:
+            seen, self._seen = self._seen, {}
+            self._flushed_at = time.monotonic()
+        items = list(seen.items())
+        written = 0
+        try:
+            for start in range(0, len(items), FLUSH_CHUNK_SIZE):
+                self._write(items[start:start + FLUSH_CHUNK_SIZE])
+                written = start + FLUSH_CHUNK_SIZE
+        except DatabaseError:
+            logger.exception("Could not write last activity times; keeping them for the next flush")
+            self._restore(items[written:])
+            return min(written, len(items))
+        return len(items)
+    
+    def _restore(self, items):
+        with self._lock:
+            for user_id, when in items:
+                # Keep a newer time recorded while the write was failing
+                if user_id not in self._seen or self._seen[user_id] < when:
+                    self._seen[user_id] = when
+    
+    def _write(self, chunk):
+        User.objects.filter(pk__in=[user_id for user_id, _ in chunk]).update(
+            last_activity=Greatest(
+                F("last_activity"),
+                Case(
+                    *[When(pk=user_id, then=Value(when)) for user_id, when in chunk],
+                    output_field=DateTimeField(),
+                ),
+            )
+        )
+
+last_activity = LastActivityBuffer()
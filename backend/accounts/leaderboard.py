@@ -0,0 +1,233 @@
+"""Impact-score leaderboards kept in memory.
+
+There is one global board ranking ``User.impact_score``, plus one board per
+action country and per calendar month of the last ``BOARD_MONTHS``,
+ranking the points users earned there or then. Each board is a Fenwick
+tree of user counts per score, so "how many users score higher than x"
+and "who is k-th" both take O(log max_score).
+
+Writes adjust this process's boards incrementally after commit, but
+other processes only see them in the database. So every process builds
+its boards from the database on first use, and rebuilds them on the
+background pool once they are ``LEADERBOARD_REBUILD_INTERVAL`` seconds
+old. That bounds how far ranks can drift between workers and from
+``impact_score``, and drops months that left the window.
+``manage.py recompute_user_stats`` rebuilds its own process's boards.
+
+Users with no points are not stored; they share the last rank.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from baltic_climate import background
+from .models import User
+
+SCOPES = ("global", "country", "month")
+# Calendar months, including the current one, that have a month board
+BOARD_MONTHS = 12
+
+
+class Leaderboard:
+    """Scores of the users on one board, ranked highest first"""
+    
+    def __init__(self, capacity=1024):
+        self.scores = {}
+        self._buckets = {}
+        self._tree = [0] * (capacity + 1)
+    
+    def __len__(self):
+        return len(self.scores)
+    
+    def add(self, user_id, delta):
+        self.set(user_id, max(self.scores.get(user_id, 0) + delta, 0))
+    
+    def set(self, user_id, score):
+        while score >= len(self._tree):
+            self._grow()
+        previous = self.scores.pop(user_id, 0)
+        if previous:
+            self._buckets[previous].discard(user_id)
+            if not self._buckets[previous]:
+                del self._buckets[previous]
+            self._update(previous, -1)
+        if score > 0:
+            self.scores[user_id] = score
+            self._buckets.setdefault(score, set()).add(user_id)
+            self._update(score, 1)
+    
+    def rank(self, user_id):
+        """1 + the number of users with a strictly higher score"""
+        return len(self.scores) - self._count_up_to(self.scores.get(user_id, 0)) + 1
+    
+    def top(self, limit):
+        """``[(rank, user_id, score)]`` for the best ``limit`` users; ties share a rank"""
+        entries = []
+        while len(entries) < limit and len(entries) < len(self.scores):
+            rank = len(entries) + 1
+            score = self._kth_highest(rank)
+            for user_id in sorted(self._buckets[score]):
+                entries.append((rank, user_id, score))
+        return entries[:limit]
+    
+    # Fenwick tree over scores 1..capacity holding the number of users per score
+    
+    def _update(self, score, delta):
+        while score < len(self._tree):
+            self._tree[score] += delta
+            score += score & -score
+    
+    def _grow(self):
+        counts = {score: len(users) for score, users in self._buckets.items()}
+        self._tree = [0] * (2 * (len(self._tree) - 1) + 1)
+        for score, count in counts.items():
+            index = score
+            while index < len(self._tree):
+                self._tree[index] += count
+                index += index & -index
+    
+    def _count_up_to(self, score):
+        score = min(score, len(self._tree) - 1)
+        count = 0
+        while score > 0:
+            count += self._tree[score]
+            score -= score & -score
+        return count
+    
+    def _kth_highest(self, k):
+        """Score of the k-th best user, found by descending the tree"""
+        remaining = len(self.scores) - k + 1
+        position = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            following = position + step
+            if following < len(self._tree) and self._tree[following] < remaining:
+                position = following
+                remaining -= self._tree[following]
+            step >>= 1
+        return position + 1
+
+
+class Leaderboards:
+    """The global, per-country and per-month boards of one process"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boards = None
+        self._built_at = None
+        self._rebuilding = False
+    
+    def top(self, scope, key, limit):
+        self._rebuild_if_stale()
+        with self._lock:
+            board = self._get(scope, key)
+            return board.top(limit) if board else []
+    
+    def standing(self, scope, key, user_id):
+        """``(rank, score)`` of ``user_id``; users without points share the last rank"""
+        self._rebuild_if_stale()
+        with self._lock:
+            board = self._get(scope, key)
+            if board is None:
+                return 1, 0
+            return board.rank(user_id), board.scores.get(user_id, 0)
+    
+    def _get(self, scope, key):
+        if self._boards is None:
+            self._boards, self._built_at = build_boards(), time.monotonic()
+        return self._boards.get((scope, key))
+    
+    def _rebuild_if_stale(self):
+        """Queue a rebuild once the boards are older than the interval; readers keep the old ones meanwhile"""
+        interval = settings.LEADERBOARD_REBUILD_INTERVAL
+        with self._lock:
+            stale = (
+                interval
+                and self._boards is not None
+                and not self._rebuilding
+                and time.monotonic() - self._built_at >= interval
+            )
+            if stale:
+                self._rebuilding = True
+        if stale:
+            background.submit(self.rebuild)
+    
+    def add_points(self, user_id, points, country, when):
+        month = month_key(when)
+        with self._lock:
+            if self._boards is None:
+                return
+            board_keys = [("global", None), ("country", country)]
+            if month >= first_board_month():
+                board_keys.append(("month", month))
+            for board_key in board_keys:
+                board = self._boards.get(board_key)
+                if board is None:
+                    board = self._boards[board_key] = Leaderboard()
+                board.add(user_id, points)
+    
+    def rebuild(self):
+        try:
+            boards = build_boards()
+            with self._lock:
+                self._boards, self._built_at = boards, time.monotonic()
+        finally:
+            self._rebuilding = False
+    
+    def reset(self):
+        with self._lock:
+            self._boards = None
+
+
+leaderboards = Leaderboards()
+
+
+def month_key(when):
+    return timezone.localtime(when).strftime("%Y-%m") if timezone.is_aware(when) else when.strftime("%Y-%m")
+
+
+def first_board_month(now=None):
+    """Key of the oldest month that still has a board"""
+    today = timezone.localdate(now)
+    months_back = today.year * 12 + today.month - 1 - (BOARD_MONTHS - 1)
+    return f"{months_back // 12:04d}-{months_back % 12 + 1:02d}"
+
+
+def build_boards():
+    """Every board, from the stored scores and the actions behind them"""
+    from actions.models import ActionParticipation, ClimateAction
+    
+    first_month = timezone.make_aware(datetime.strptime(first_board_month(), "%Y-%m"))
+    boards = {("global", None): Leaderboard()}
+    for user_id, score in User.objects.filter(impact_score__gt=0).values_list("pk", "impact_score"):
+        boards["global", None].set(user_id, score)
+    
+    earned = [
+        (ActionParticipation.objects, "user_id", "action__country", "registered_at", User.JOINED_ACTION_POINTS),
+        (ClimateAction.objects, "organizer_id", "country", "created_at", User.ORGANIZED_ACTION_POINTS),
+    ]
+    for manager, user_field, country_field, date_field, points in earned:
+        by_country = manager.order_by().values_list(user_field, country_field).annotate(n=Count("pk"))
+        for user_id, country, count in by_country:
+            boards.setdefault(("country", country), Leaderboard()).add(user_id, count * points)
+        by_month = (
+            manager.filter(**{f"{date_field}__gte": first_month})
+            .order_by()
+            .values_list(user_field, TruncMonth(date_field))
+            .annotate(n=Count("pk"))
+        )
+        for user_id, month, count in by_month:
+            boards.setdefault(("month", month_key(month)), Leaderboard()).add(user_id, count * points)
+    return boards
+
+
+def record_points(user_id, points, country, when):
+    """Move ``user_id`` on every board it scores on once the transaction commits"""
+    transaction.on_commit(lambda: leaderboards.add_points(user_id, points, country, when))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from accounts.achievements import evaluate_achievements
+
+
+class Command(BaseCommand):
+    help = "Award every achievement whose rule users now meet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="user_ids", help="Only evaluate this user id")
+
+    def handle(self, *args, **options):
+        awarded = evaluate_achievements(options["user_ids"])
+        summary = ", ".join(f"{count} {achievement_type}" for achievement_type, count in awarded.items())
+        self.stdout.write(self.style.SUCCESS(f"Awarded achievements: {summary}"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from accounts.leaderboard import leaderboards
+from accounts.models import User
+from actions.models import ActionParticipation, ClimateAction
+
+
+def _count_per_user(queryset, user_field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{user_field: OuterRef("pk")})
+            .order_by()
+            .values(user_field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = "Rebuild actions_joined, actions_organized and impact_score for every user"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = User.objects.update(
+                actions_joined=_count_per_user(ActionParticipation.objects.all(), "user"),
+                actions_organized=_count_per_user(ClimateAction.objects.all(), "organizer"),
+            )
+            User.objects.update(
+                impact_score=F("actions_joined") * User.JOINED_ACTION_POINTS
+                + F("actions_organized") * User.ORGANIZED_ACTION_POINTS
+            )
+        leaderboards.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Recomputed stats for {updated} users"))
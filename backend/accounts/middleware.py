@@ -0,0 +1,20 @@
+from .last_activity import last_activity
+
+
+class LastActivityMiddleware:
+    """Note when authenticated users were last seen; the buffer writes them back in bulk.
+    
+    DRF copies the user it authenticates (e.g. from a JWT) onto the Django
+    request, so API requests are seen here once the view has run.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            last_activity.touch(user.pk)
+        last_activity.flush_if_due()
+        return response
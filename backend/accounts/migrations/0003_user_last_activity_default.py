@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-19 17:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_user_avatar_derivatives"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="last_activity",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
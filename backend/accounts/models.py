@@ -1,9 +1,12 @@
 from django.db import models
+from django.db.models.lookups import GreaterThanOrEqual
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
+from baltic_climate.counters import CounterFieldsMixin
 
-class User(AbstractUser):
+
+class User(CounterFieldsMixin, AbstractUser):
     """Custom User model with additional fields for climate activism tracking"""
     
     email = models.EmailField(unique=True)
@@ -12,10 +15,13 @@ class User(AbstractUser):
     bio = models.TextField(max_length=500, blank=True)
     location = models.CharField(max_length=100, blank=True)
     avatar = models.ImageField(upload_to="avatars/", blank=True, null=True)
+    # Resized copies of ``avatar``, maintained by baltic_climate.images
+    avatar_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     
     # Activity tracking
     date_joined = models.DateTimeField(default=timezone.now)
-    last_activity = models.DateTimeField(auto_now=True)
+    # Written in bulk by accounts.last_activity rather than on every save
+    last_activity = models.DateTimeField(default=timezone.now)
     
     # Climate activism stats
     actions_joined = models.PositiveIntegerField(default=0)
@@ -26,6 +32,13 @@ class User(AbstractUser):
     email_notifications = models.BooleanField(default=True)
     location_sharing = models.BooleanField(default=True)
     
+    # Kept by actions.signals and recompute_user_stats with UPDATEs, never by save()
+    COUNTER_FIELDS = ("actions_joined", "actions_organized", "impact_score")
+    
+    # Impact score awarded per joined and per organized action
+    JOINED_ACTION_POINTS = 5
+    ORGANIZED_ACTION_POINTS = 10
+    
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username", "first_name", "last_name"]
     
@@ -45,6 +58,9 @@ class User(AbstractUser):
 class UserActivity(models.Model):
     """Track daily user activities for contribution graph"""
     
+    # (minimum action_count, contribution_level), highest level first
+    CONTRIBUTION_LEVELS = [(5, 4), (3, 3), (2, 2), (1, 1)]
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="activities")
     date = models.DateField()
     action_count = models.PositiveIntegerField(default=0)
@@ -58,6 +74,46 @@ class UserActivity(models.Model):
     
     def __str__(self):
         return f"{self.user.full_name} - {self.date} ({self.action_count} actions)"
+    
+    @classmethod
+    def level_for(cls, action_count):
+        for minimum, level in cls.CONTRIBUTION_LEVELS:
+            if action_count >= minimum:
+                return level
+        return 0
+    
+    @classmethod
+    def level_expression(cls, action_count):
+        """``level_for`` as a database expression over ``action_count``"""
+        return models.Case(
+            *[
+                models.When(GreaterThanOrEqual(action_count, minimum), then=models.Value(level))
+                for minimum, level in cls.CONTRIBUTION_LEVELS
+            ],
+            default=models.Value(0),
+        )
+    
+    @classmethod
+    def record(cls, user_id, date):
+        """Count one more action for the user on ``date`` and refresh its level"""
+        activity, created = cls.objects.get_or_create(
+            user_id=user_id,
+            date=date,
+            defaults={"action_count": 1, "contribution_level": cls.level_for(1)},
+        )
+        if not created:
+            new_count = models.F("action_count") + 1
+            cls.objects.filter(pk=activity.pk).update(
+                action_count=new_count, contribution_level=cls.level_expression(new_count)
+            )
+    
+    @classmethod
+    def unrecord(cls, user_id, date):
+        """Count one action less for the user on ``date``; a day left empty is removed"""
+        day = cls.objects.filter(user_id=user_id, date=date)
+        if not day.filter(action_count__lte=1).delete()[0]:
+            new_count = models.F("action_count") - 1
+            day.update(action_count=new_count, contribution_level=cls.level_expression(new_count))
 
 
 class UserAchievement(models.Model):
@@ -1,5 +1,13 @@
+import re
+from datetime import timedelta
+
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Length
+from baltic_climate.images import derivative_urls
+from .activity import activity_summary
+from .leaderboard import leaderboards
 from .models import User, UserActivity, UserAchievement
 
 
@@ -11,30 +19,43 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         model = User
         fields = ("email", "username", "first_name", "last_name", "password")
     
+    # Attempts before giving up when concurrent registrations keep taking the allocated name
+    USERNAME_ATTEMPTS = 5
+    
     def create(self, validated_data):
         password = validated_data.pop("password")
         
         # Create username from provided username or email
-        if "username" not in validated_data or not validated_data["username"]:
-            email = validated_data["email"]
-            username = email.split("@")[0]
-        else:
-            username = validated_data["username"]
-        
-        base_username = username
-        counter = 1
-        
-        # Ensure username is unique
-        while User.objects.filter(username=username).exists():
-            username = f"{base_username}{counter}"
-            counter += 1
+        base_username = validated_data.pop("username", None) or validated_data["email"].split("@")[0]
         
-        validated_data["username"] = username
-        user = User.objects.create_user(**validated_data)
-        user.set_password(password)
-        user.save()
-        
-        return user
+        for attempt in range(self.USERNAME_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    # Passing the password to create_user hashes it exactly once
+                    return User.objects.create_user(
+                        username=next_free_username(base_username), password=password, **validated_data
+                    )
+            except IntegrityError:
+                if User.objects.filter(email__iexact=validated_data["email"]).exists():
+                    raise serializers.ValidationError({"email": ["user with this email already exists."]})
+        raise serializers.ValidationError({"username": ["Could not allocate a unique username, please try again."]})
+
+
+def next_free_username(base):
+    """``base``, or ``base`` with the next unused numeric suffix.
+    
+    One query finds the highest taken suffix: names are matched without
+    leading zeros, so the longest name is the highest number.
+    """
+    latest = (
+        User.objects.filter(username__startswith=base, username__regex=rf"^{re.escape(base)}([1-9][0-9]*)?$")
+        .order_by(Length("username").desc(), "-username")
+        .values_list("username", flat=True)
+        .first()
+    )
+    if latest is None:
+        return base
+    return f"{base}{int(latest[len(base):] or 0) + 1}"
 
 
 class UserLoginSerializer(serializers.Serializer):
@@ -62,16 +83,20 @@ class UserLoginSerializer(serializers.Serializer):
 
 class UserProfileSerializer(serializers.ModelSerializer):
     full_name = serializers.ReadOnlyField()
+    avatar_urls = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = (
             "id", "email", "first_name", "last_name", "full_name", 
-            "bio", "location", "avatar", "date_joined", "last_activity",
+            "bio", "location", "avatar", "avatar_urls", "date_joined", "last_activity",
             "actions_joined", "actions_organized", "impact_score",
             "email_notifications", "location_sharing"
         )
         read_only_fields = ("id", "date_joined", "last_activity", "actions_joined", "actions_organized", "impact_score")
+    
+    def get_avatar_urls(self, obj):
+        return derivative_urls(obj.avatar_derivatives, self.context.get("request"))
 
 
 class UserActivitySerializer(serializers.ModelSerializer):
@@ -87,13 +112,40 @@ class UserAchievementSerializer(serializers.ModelSerializer):
 
 
 class UserStatsSerializer(serializers.ModelSerializer):
-    activities = UserActivitySerializer(many=True, read_only=True)
-    achievements = UserAchievementSerializer(many=True, read_only=True)
+    rank = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = (
             "id", "full_name", "bio", "location", "avatar",
-            "actions_joined", "actions_organized", "impact_score",
-            "activities", "achievements"
+            "actions_joined", "actions_organized", "impact_score", "rank",
         )
+    
+    def get_rank(self, obj):
+        """Position on the global impact-score leaderboard"""
+        return leaderboards.standing("global", None, obj.pk)[0]
+
+
+class ActivityStatsSerializer(serializers.Serializer):
+    """The cacheable part of the stats payload, for a user loaded with ``stats_prefetches()``.
+    
+    Expects ``days`` (the activity window) and ``today`` in the context.
+    """
+    window = serializers.SerializerMethodField()
+    activities = serializers.SerializerMethodField()
+    achievements = UserAchievementSerializer(many=True, read_only=True, source="earned_achievements")
+    summary = serializers.SerializerMethodField()
+    
+    def window_start(self):
+        return self.context["today"] - timedelta(days=self.context["days"] - 1)
+    
+    def get_window(self, obj):
+        today = self.context["today"]
+        return {"start": self.window_start().isoformat(), "end": today.isoformat(), "days": self.context["days"]}
+    
+    def get_activities(self, obj):
+        start = self.window_start()
+        return UserActivitySerializer([a for a in obj.recent_activities if a.date >= start], many=True).data
+    
+    def get_summary(self, obj):
+        return activity_summary(obj.recent_activities, self.context["today"])
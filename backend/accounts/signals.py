@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from baltic_climate.images import image_saved
+from .authentication import forget_cached_user
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def refresh_avatar_derivatives(sender, instance, raw=False, **kwargs):
+    if not raw:
+        image_saved(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    forget_cached_user(instance.pk)
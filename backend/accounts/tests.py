@@ -1,3 +1,591 @@
-from django.test import TestCase
+import random
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import get_hasher
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from actions.models import ClimateAction, ActionParticipation
+from actions.tests import make_action, make_user
+from baltic_climate import background
+from baltic_climate.cache import bump_version
+from .achievements import RULES
+from .activity import record_activity
+from .last_activity import LastActivityBuffer, last_activity
+from .leaderboard import Leaderboard, leaderboards, month_key
+from .models import User, UserAchievement, UserActivity
+from .tokens import FALSE_POSITIVE_RATE, NAMESPACE, BloomFilter, blacklist_filter, prune_expired_tokens
+
+
+class UserStatsCounterTests(TestCase):
+    def setUp(self):
+        self.organizer = make_user("organizer")
+        self.participant = make_user("participant")
+
+    def assertStats(self, user, joined, organized):
+        user.refresh_from_db()
+        self.assertEqual(
+            (user.actions_joined, user.actions_organized, user.impact_score),
+            (
+                joined,
+                organized,
+                joined * User.JOINED_ACTION_POINTS + organized * User.ORGANIZED_ACTION_POINTS,
+            ),
+        )
+
+    def test_counters_follow_actions_and_participations(self):
+        first = make_action(self.organizer)
+        second = make_action(self.organizer)
+        ActionParticipation.objects.create(user=self.participant, action=first)
+        participation = ActionParticipation.objects.create(user=self.participant, action=second)
+        self.assertStats(self.organizer, joined=0, organized=2)
+        self.assertStats(self.participant, joined=2, organized=0)
+
+        participation.delete()
+        self.assertStats(self.participant, joined=1, organized=0)
+
+        first.delete()
+        self.assertStats(self.organizer, joined=0, organized=1)
+        self.assertStats(self.participant, joined=0, organized=0)
+
+    def test_deleting_an_action_does_not_load_it_per_participant(self):
+        action = make_action(self.organizer, country="Latvia")
+        for i in range(5):
+            ActionParticipation.objects.create(user=make_user(f"joiner{i}"), action=action)
+        action = ClimateAction.objects.get(pk=action.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            action.delete()
+        action_reads = [q["sql"] for q in queries if q["sql"].startswith('SELECT "actions_climateaction"')]
+        self.assertEqual(action_reads, [])
+        self.assertStats(self.organizer, joined=0, organized=0)
+        self.assertFalse(User.objects.filter(actions_joined__gt=0).exists())
+
+    def test_saving_a_stale_user_keeps_the_counters(self):
+        stale = User.objects.get(pk=self.participant.pk)
+        ActionParticipation.objects.create(user=self.participant, action=make_action(self.organizer))
+
+        stale.bio = "Cleans beaches."
+        stale.save()
+        self.assertStats(self.participant, joined=1, organized=0)
+        self.assertEqual(self.participant.bio, "Cleans beaches.")
+
+    def test_recompute_command_rebuilds_drifted_counters(self):
+        action = make_action(self.organizer)
+        ActionParticipation.objects.create(user=self.participant, action=action)
+        User.objects.update(actions_joined=7, actions_organized=3, impact_score=99)
+
+        call_command("recompute_user_stats", stdout=StringIO())
+
+        self.assertStats(self.organizer, joined=0, organized=1)
+        self.assertStats(self.participant, joined=1, organized=0)
+
+
+class UserActivityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user("activist")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_joining_and_completing_record_activity(self):
+        organizer = make_user("organizer")
+        participations = [
+            ActionParticipation.objects.create(user=self.user, action=make_action(organizer)) for _ in range(2)
+        ]
+        participations[0].participation_type = "completed"
+        participations[0].save()
+        participations[0].save()
+
+        activity = UserActivity.objects.get(user=self.user)
+        self.assertEqual(activity.date, timezone.localdate())
+        self.assertEqual((activity.action_count, activity.contribution_level), (3, 3))
+
+    def test_leaving_takes_back_the_day_joined(self):
+        organizer = make_user("organizer")
+        first, second = (
+            ActionParticipation.objects.create(user=self.user, action=make_action(organizer)) for _ in range(2)
+        )
+        self.assertTrue(self.client.get(reverse("user_activities")).data["levels"].endswith("2"))
+
+        first.delete()
+        activity = UserActivity.objects.get(user=self.user)
+        self.assertEqual((activity.action_count, activity.contribution_level), (1, 1))
+        self.assertTrue(self.client.get(reverse("user_activities")).data["levels"].endswith("1"))
+
+        second.delete()
+        self.assertFalse(UserActivity.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.get(reverse("user_activities")).data["total_actions"], 0)
+
+    def test_graph_is_compact_and_cached_until_the_next_write(self):
+        today = timezone.localdate()
+        UserActivity.objects.create(user=self.user, date=today - timedelta(days=1), action_count=5, contribution_level=4)
+
+        response = self.client.get(reverse("user_activities"))
+        self.assertEqual(response.data["end"], today.isoformat())
+        self.assertEqual(response.data["start"], (today - timedelta(days=365)).isoformat())
+        self.assertEqual(len(response.data["levels"]), 366)
+        self.assertTrue(response.data["levels"].endswith("40"))
+        self.assertEqual(response.data["total_actions"], 5)
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse("user_activities"))
+
+        ActionParticipation.objects.create(user=self.user, action=make_action(make_user("organizer")))
+        response = self.client.get(reverse("user_activities"))
+        self.assertTrue(response.data["levels"].endswith("41"))
+        self.assertEqual(response.data["total_actions"], 6)
+
+
+class LeaderboardStructureTests(TestCase):
+    def test_ranks_and_top_match_a_sorted_list(self):
+        rng = random.Random(7)
+        board = Leaderboard(capacity=4)
+        scores = {}
+        for _ in range(2000):
+            user_id = rng.randrange(60)
+            delta = rng.choice([-10, -5, 5, 10, 35])
+            board.add(user_id, delta)
+            scores[user_id] = max(scores.get(user_id, 0) + delta, 0)
+
+        ranked = sorted(((score, user_id) for user_id, score in scores.items() if score), key=lambda x: (-x[0], x[1]))
+        expected_top = [(1 + sum(s > score for s, _ in ranked), user_id, score) for score, user_id in ranked]
+        self.assertEqual(board.top(len(ranked) + 5), expected_top)
+        self.assertEqual(board.top(3), expected_top[:3])
+        for user_id in range(60):
+            self.assertEqual(board.rank(user_id), 1 + sum(s > scores.get(user_id, 0) for s, _ in ranked))
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        leaderboards.reset()
+        self.addCleanup(leaderboards.reset)
+        self.user = make_user("activist")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def leaderboard(self, **params):
+        response = self.client.get(reverse("leaderboard"), params)
+        self.assertEqual(response.status_code, 200)
+        return [(entry["rank"], entry["user"]["full_name"], entry["score"]) for entry in response.data["results"]], response.data["me"]
+
+    def test_boards_follow_writes_and_match_a_rebuild(self):
+        organizer = make_user("organizer")
+        self.assertEqual(self.leaderboard(), ([], {"rank": 1, "score": 0}))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            riga = make_action(organizer, country="Latvia")
+            gdansk = make_action(organizer, country="Poland")
+            ActionParticipation.objects.create(user=self.user, action=riga)
+            ActionParticipation.objects.create(user=make_user("second"), action=gdansk)
+
+        results, me = self.leaderboard()
+        self.assertEqual(results, [(1, "Organizer Tester", 20), (2, "Activist Tester", 5), (2, "Second Tester", 5)])
+        self.assertEqual(me, {"rank": 2, "score": 5})
+        self.assertEqual(self.leaderboard(scope="country", country="Latvia")[0], [
+            (1, "Organizer Tester", 10), (2, "Activist Tester", 5),
+        ])
+        month = timezone.localtime().strftime("%Y-%m")
+        self.assertEqual(len(self.leaderboard(scope="month", month=month)[0]), 3)
+        self.assertEqual(self.client.get(reverse("user_stats")).data["rank"], 2)
+
+        board_keys = [("global", None), ("country", "Latvia"), ("country", "Poland"), ("month", month)]
+        incremental = {board_key: leaderboards.top(*board_key, 10) for board_key in board_keys}
+        leaderboards.rebuild()
+        self.assertEqual({board_key: leaderboards.top(*board_key, 10) for board_key in board_keys}, incremental)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            riga.delete()
+        self.assertEqual(self.leaderboard(scope="country", country="Latvia")[0], [])
+        self.assertEqual(self.leaderboard()[0], [(1, "Organizer Tester", 10), (2, "Second Tester", 5)])
+
+    @override_settings(LEADERBOARD_REBUILD_INTERVAL=60, BACKGROUND_TASKS_EAGER=True)
+    def test_stale_boards_are_rebuilt_in_the_background(self):
+        self.assertEqual(self.leaderboard()[0], [])
+        # Points written by another process only reach the database
+        User.objects.filter(pk=self.user.pk).update(impact_score=15)
+        self.assertEqual(self.leaderboard()[0], [])
+
+        later = time.monotonic() + 61
+        with mock.patch("accounts.leaderboard.time.monotonic", return_value=later):
+            with mock.patch("accounts.leaderboard.background.submit", wraps=background.submit) as submit:
+                self.assertEqual(self.leaderboard()[0], [(1, "Activist Tester", 15)])
+                self.leaderboard()
+        rebuilds = [call for call in submit.call_args_list if call.args == (leaderboards.rebuild,)]
+        self.assertEqual(len(rebuilds), 1)
+
+    def test_months_outside_the_window_have_no_board(self):
+        organizer = make_user("organizer")
+        long_ago = timezone.now() - timedelta(days=400)
+        old_month = month_key(long_ago)
+        with self.captureOnCommitCallbacks(execute=True):
+            action = make_action(organizer, country="Latvia")
+        ClimateAction.objects.filter(pk=action.pk).update(created_at=long_ago)
+        leaderboards.rebuild()
+        self.assertEqual(leaderboards.top("month", old_month, 10), [])
+        self.assertEqual(leaderboards.top("country", "Latvia", 10), [(1, organizer.pk, 10)])
+
+        leaderboards.add_points(self.user.pk, 5, "Latvia", long_ago)
+        self.assertEqual(leaderboards.top("month", old_month, 10), [])
+        self.assertEqual(leaderboards.top("global", None, 10)[-1], (2, self.user.pk, 5))
+
+    def test_rejects_unknown_scopes(self):
+        self.assertEqual(self.client.get(reverse("leaderboard"), {"scope": "galaxy"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("leaderboard"), {"scope": "country"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("leaderboard"), {"limit": -3}).status_code, 400)
+
+
+class AchievementTests(TestCase):
+    def setUp(self):
+        self.organizer = make_user("organizer")
+        self.scientist = make_user("scientist")
+
+    def achievements(self, user):
+        return set(user.achievements.values_list("achievement_type", flat=True))
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_events_award_achievements_incrementally(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            actions = [make_action(self.organizer, action_type="citizen_science") for _ in range(3)]
+        self.assertEqual(self.achievements(self.organizer), {"organizer"})
+
+        for action in actions:
+            with self.captureOnCommitCallbacks(execute=True):
+                ActionParticipation.objects.create(user=self.scientist, action=action)
+        self.assertEqual(self.achievements(self.scientist), {"citizen_scientist"})
+        self.assertEqual(self.scientist.achievements.get().name, "Citizen Scientist")
+
+    def test_command_awards_everyone_with_set_based_queries(self):
+        for action_type in ("citizen_science", "citizen_science", "protest", "workshop", "seminar", "workshop"):
+            action = make_action(self.organizer, action_type=action_type)
+            ActionParticipation.objects.create(user=self.scientist, action=action)
+        popular = make_action(self.organizer)
+        for i in range(25):
+            ActionParticipation.objects.create(user=make_user(f"fan{i}"), action=popular)
+        User.objects.filter(pk=self.scientist.pk).update(impact_score=150)
+
+        # One select per rule, plus one insert per rule that awarded someone
+        with self.assertNumQueries(len(RULES) + 4):
+            call_command("evaluate_achievements", stdout=StringIO())
+        self.assertEqual(self.achievements(self.organizer), {"organizer", "mentor", "community_builder"})
+        self.assertEqual(self.achievements(self.scientist), {"climate_champion"})
+
+        ActionParticipation.objects.create(user=self.scientist, action=make_action(self.organizer, action_type="citizen_science"))
+        call_command("evaluate_achievements", stdout=StringIO())
+        self.assertEqual(self.achievements(self.scientist), {"climate_champion", "citizen_scientist"})
+        self.assertEqual(UserAchievement.objects.count(), 5)
+
+
+class RegistrationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+    
+    def payload(self, email):
+        return {"email": email, "first_name": "Anna", "last_name": "Tester", "password": "s3cret-pass"}
+    
+    def register(self, email):
+        self.client.post(reverse("register"), self.payload(email), format="json")
+        return User.objects.get(email=email).username
+    
+    def test_colliding_names_get_the_next_suffix_in_constant_queries(self):
+        self.assertEqual(self.register("anna@one.example"), "anna")
+        self.assertEqual(self.register("anna@two.example"), "anna1")
+        
+        for name in ("anna7", "anna10", "anna007", "annabel", "anna10x"):
+            make_user(name)
+        # Email check, savepoint, username lookup, insert, release, outstanding refresh token
+        with self.assertNumQueries(6):
+            self.client.post(reverse("register"), self.payload("anna@three.example"), format="json")
+        self.assertTrue(User.objects.filter(username="anna11").exists())
+        
+        User.objects.bulk_create(User(username=f"anna{n}", email=f"anna{n}@bulk.example") for n in range(12, 500))
+        with self.assertNumQueries(6):
+            self.client.post(reverse("register"), self.payload("anna@four.example"), format="json")
+        self.assertTrue(User.objects.filter(username="anna500").exists())
+    
+    def test_password_is_hashed_once(self):
+        hasher = get_hasher()
+        with mock.patch.object(type(hasher), "encode", autospec=True, side_effect=type(hasher).encode) as encode:
+            self.register("ola@example.com")
+        self.assertEqual(encode.call_count, 1)
+        self.assertTrue(User.objects.get(email="ola@example.com").check_password("s3cret-pass"))
+    
+    def test_retries_when_a_concurrent_registration_takes_the_name(self):
+        make_user("ola")
+        with mock.patch("accounts.serializers.next_free_username", side_effect=["ola", "ola1"]):
+            username = self.register("ola@another.example")
+        self.assertEqual(username, "ola1")
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user("anna")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+    
+    def test_user_is_loaded_once_per_cache_version(self):
+        self.assertEqual(self.client.get(reverse("map_actions")).status_code, 200)
+        # The map payload and the user are both cached now
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("map_actions")).status_code, 200)
+        
+        self.user.first_name = "Ania"
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.client.get(reverse("map_actions"))
+    
+    def test_deactivation_takes_effect_immediately(self):
+        self.client.get(reverse("map_actions"))
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse("map_actions")).status_code, 401)
+    
+    def test_profile_views_read_fresh_counters(self):
+        self.client.get(reverse("user_profile"))
+        make_action(self.user)
+        self.assertEqual(self.client.get(reverse("user_profile")).data["impact_score"], User.ORGANIZED_ACTION_POINTS)
+        self.assertEqual(self.client.get(reverse("user_stats")).data["actions_organized"], 1)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        blacklist_filter.reset()
+        self.user = make_user("anna")
+        self.client = APIClient()
+        # The fast path needs a cache shared between processes, which the tests pretend LocMemCache is
+        shared = mock.patch("accounts.tokens.cache_is_shared", return_value=True)
+        self.shared_cache = shared.start()
+        self.addCleanup(shared.stop)
+    
+    def refresh(self, token):
+        return self.client.post(reverse("token_refresh"), {"refresh": str(token)}, format="json")
+    
+    def blacklist_checks(self, queries):
+        """The exact membership queries of RefreshToken.check_blacklist"""
+        return [q["sql"] for q in queries if q["sql"].startswith('SELECT 1 AS "a" FROM "token_blacklist_blacklistedtoken"')]
+    
+    def blacklist_reads(self, queries):
+        """Every read of the blacklist table, membership checks and filter syncs alike"""
+        return [
+            q["sql"] for q in queries
+            if q["sql"].startswith("SELECT") and '"token_blacklist_blacklistedtoken"' in q["sql"]
+        ]
+    
+    def blacklist_elsewhere(self, token):
+        """Blacklist ``token`` the way another process would, without touching this one's filter"""
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token["jti"]))
+    
+    def test_rotated_refresh_token_is_rejected(self):
+        token = RefreshToken.for_user(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(self.refresh(response.data["refresh"]).status_code, 200)
+    
+    def test_clean_tokens_skip_the_blacklist_table(self):
+        token = RefreshToken.for_user(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            token = self.refresh(token).data["refresh"]
+        for _ in range(4):
+            with CaptureQueriesContext(connection) as queries:
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.refresh(token)
+            self.assertEqual(response.status_code, 200)
+            token = response.data["refresh"]
+            # Only blacklist() looking up the rotated token's row before inserting it
+            self.assertEqual(len(self.blacklist_reads(queries)), 1)
+            self.assertEqual(self.blacklist_checks(queries), [])
+        self.assertEqual(blacklist_filter._filter.count, BlacklistedToken.objects.count())
+    
+    def test_the_filter_is_built_off_the_request_path(self):
+        token = RefreshToken.for_user(self.user)
+        with mock.patch("accounts.tokens.background.submit") as submit:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(blacklist_filter.might_contain(str(token["jti"])))
+        submit.assert_called_once()
+        self.assertEqual(self.blacklist_reads(queries), [])
+        
+        # What the background pool would run
+        submit.call_args.args[0]()
+        self.assertFalse(blacklist_filter.might_contain(str(token["jti"])))
+    
+    def test_tokens_blacklisted_by_another_process_are_picked_up(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertFalse(blacklist_filter.might_contain(str(token["jti"])))
+        
+        self.blacklist_elsewhere(token)
+        bump_version(NAMESPACE)
+        self.assertEqual(self.refresh(token).status_code, 401)
+    
+    @override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=0)
+    def test_filter_resyncs_without_a_version_bump(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertFalse(blacklist_filter.might_contain(str(token["jti"])))
+        
+        # The version bump was lost, e.g. evicted or never shared
+        self.blacklist_elsewhere(token)
+        self.assertEqual(self.refresh(token).status_code, 401)
+    
+    def test_process_local_cache_always_checks_the_table(self):
+        self.shared_cache.return_value = False
+        token = RefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(RefreshToken.for_user(self.user)).status_code, 200)
+        
+        self.blacklist_elsewhere(token)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(len(self.blacklist_checks(queries)), 1)
+    
+    def test_prune_expired_tokens(self):
+        expired = RefreshToken.for_user(self.user)
+        fresh = RefreshToken.for_user(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            expired.blacklist()
+        OutstandingToken.objects.filter(jti=expired["jti"]).update(expires_at=timezone.now() - timedelta(seconds=1))
+        
+        self.assertEqual(prune_expired_tokens(chunk_size=1), 1)
+        self.assertEqual(list(OutstandingToken.objects.values_list("jti", flat=True)), [fresh["jti"]])
+        self.assertFalse(BlacklistedToken.objects.exists())
+        self.assertFalse(blacklist_filter.might_contain(expired["jti"]))
+
+
+class BloomFilterTests(TestCase):
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        bloom = BloomFilter(10_000)
+        members = [f"member-{n}" for n in range(10_000)]
+        for member in members:
+            bloom.add(member)
+        self.assertTrue(all(member in bloom for member in members))
+        false_positives = sum(f"other-{n}" in bloom for n in range(10_000))
+        self.assertLess(false_positives, 2.5 * FALSE_POSITIVE_RATE * 10_000)
+
+
+class UserStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user("activist")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.today = timezone.localdate()
+    
+    def active_on(self, *days_ago, count=1):
+        for days in days_ago:
+            UserActivity.objects.create(
+                user=self.user, date=self.today - timedelta(days=days),
+                action_count=count, contribution_level=UserActivity.level_for(count),
+            )
+    
+    def stats(self, **params):
+        return self.client.get(reverse("user_stats"), params)
+    
+    def test_activities_are_limited_to_the_window(self):
+        self.active_on(10, 100, 400)
+        self.assertEqual(len(self.stats().data["activities"]), 1)
+        response = self.stats(days=120)
+        self.assertEqual([a["date"] for a in response.data["activities"]], [
+            (self.today - timedelta(days=10)).isoformat(), (self.today - timedelta(days=100)).isoformat(),
+        ])
+        self.assertEqual(response.data["window"]["start"], (self.today - timedelta(days=119)).isoformat())
+        self.assertEqual(self.stats(days=0).status_code, 400)
+        self.assertEqual(self.stats(days="all").status_code, 400)
+    
+    def test_summary_has_streaks_and_monthly_totals(self):
+        self.active_on(1, 2, 3, count=2)
+        self.active_on(20, 21, 22, 23)
+        summary = self.stats().data["summary"]
+        self.assertEqual((summary["current_streak"], summary["longest_streak"]), (3, 4))
+        self.assertEqual(len(summary["months"]), 12)
+        self.assertEqual(summary["months"][-1]["month"], self.today.strftime("%Y-%m"))
+        self.assertEqual(sum(month["actions"] for month in summary["months"]), 10)
+    
+    def test_activity_is_cached_until_the_next_write(self):
+        self.active_on(1)
+        with self.assertNumQueries(3):
+            self.stats()
+        # Only the user row, for fresh counters
+        with self.assertNumQueries(1):
+            response = self.stats()
+        self.assertEqual(response.data["summary"]["current_streak"], 1)
+        
+        record_activity(self.user.pk)
+        response = self.stats()
+        self.assertEqual(response.data["summary"]["current_streak"], 2)
+        
+        make_action(self.user)
+        self.assertEqual(self.stats().data["actions_organized"], 1)
+
+
+class LastActivityTests(TestCase):
+    def setUp(self):
+        last_activity.flush()
+        self.user = make_user("anna")
+        self.long_ago = timezone.now() - timedelta(days=30)
+        User.objects.filter(pk=self.user.pk).update(last_activity=self.long_ago)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+    
+    def last_seen(self, user):
+        return User.objects.values_list("last_activity", flat=True).get(pk=user.pk)
+    
+    def test_requests_are_buffered_not_written(self):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                self.client.get(reverse("map_actions"))
+        self.assertFalse([q for q in queries if q["sql"].startswith("UPDATE")])
+        self.assertEqual(len(last_activity), 1)
+        self.assertEqual(self.last_seen(self.user), self.long_ago)
+        
+        with self.settings(LAST_ACTIVITY_FLUSH_INTERVAL=0):
+            with mock.patch("accounts.last_activity.background.submit") as submit:
+                self.client.get(reverse("map_actions"))
+        # The write is handed to the background pool, not done on the request
+        submit.assert_called_once_with(last_activity.flush)
+        self.assertEqual(self.last_seen(self.user), self.long_ago)
+        
+        with self.settings(LAST_ACTIVITY_FLUSH_INTERVAL=0, BACKGROUND_TASKS_EAGER=True):
+            self.client.get(reverse("map_actions"))
+        self.assertEqual(len(last_activity), 0)
+        self.assertGreater(self.last_seen(self.user), self.long_ago)
+    
+    @override_settings(LAST_ACTIVITY_FLUSH_INTERVAL=0, BACKGROUND_TASKS_EAGER=True)
+    def test_failed_flush_keeps_the_times_and_the_response(self):
+        with mock.patch.object(LastActivityBuffer, "_write", side_effect=OperationalError("database is locked")):
+            with self.assertLogs("accounts.last_activity", "ERROR"):
+                self.assertEqual(self.client.get(reverse("map_actions")).status_code, 200)
+        self.assertEqual(len(last_activity), 1)
+        
+        self.assertEqual(last_activity.flush(), 1)
+        self.assertGreater(self.last_seen(self.user), self.long_ago)
+    
+    def test_flush_is_one_update_and_never_moves_backwards(self):
+        others = [make_user(f"user{n}") for n in range(5)]
+        now = timezone.now()
+        for user in others:
+            last_activity.touch(user.pk, now)
+        last_activity.touch(self.user.pk, self.long_ago - timedelta(days=1))
+        
+        with self.assertNumQueries(1):
+            self.assertEqual(last_activity.flush(), 6)
+        self.assertEqual({self.last_seen(user) for user in others}, {now})
+        self.assertEqual(self.last_seen(self.user), self.long_ago)
+    
+    def test_saving_the_profile_keeps_last_activity(self):
+        self.user.refresh_from_db()
+        self.user.bio = "Sea level watcher"
+        self.user.save()
+        self.assertEqual(self.last_seen(self.user), self.long_ago)
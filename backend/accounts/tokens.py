@@ -0,0 +1,226 @@
+"""Refresh-token blacklist with an in-memory fast path.
+
+Rotating a refresh token blacklists the old one, so every refresh checks
+the ``token_blacklist`` tables. Each process keeps a Bloom filter of the
+blacklisted JTIs. A JTI the filter has never seen is certainly not
+blacklisted and skips the database. Only filter hits (real ones, plus
+about ``FALSE_POSITIVE_RATE`` of clean tokens) are confirmed with a
+query. The cost of a refresh therefore stays flat as the blacklist grows.
+
+Every blacklisting bumps a cache version. A process adds the JTIs it
+blacklists itself straight to its filter, and moves its version along when
+its bump was the only one. When another process has bumped the version,
+the filter is out of date: checks go to the table until a background job
+has loaded the rows added since the last sync. Loading re-reads a margin
+of older ids, to catch transactions that committed late, but adds only
+ids it has not seen. The same job also syncs every
+``TOKEN_BLACKLIST_SYNC_INTERVAL`` seconds, in case a bump was lost, and
+builds a larger filter once this one is full. Nothing scans the table on
+the request path.
+
+Other processes only see the version if the cache is shared between
+them. With a process-local cache (the default LocMemCache), a token
+rotated in one worker would be missing from every other worker's filter
+until its next timed sync. So the fast path is disabled there, and every
+check goes to the table.
+
+Expired tokens are pruned by ``prune_expired_tokens`` (every
+``TOKEN_BLACKLIST_PRUNE_INTERVAL`` seconds in ``manage.py
+run_periodic_tasks``, or ``manage.py flushexpiredtokens``). Pruning
+never un-blacklists a live token. The web processes' filters just keep
+the pruned JTIs, which only costs confirming lookups, until they fill
+up and are rebuilt.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from baltic_climate import background
+from baltic_climate.cache import bump_version, cache_is_shared, get_version
+
+NAMESPACE = "token_blacklist"
+FALSE_POSITIVE_RATE = 0.01
+MIN_CAPACITY = 1 << 16
+# Ids this far below the highest one seen are read again on every sync, in
+# case their transaction committed after a later one
+SYNC_ID_OVERLAP = 100
+LOAD_CHUNK_SIZE = 10_000
+PRUNE_CHUNK_SIZE = 10_000
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives"""
+
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class BlacklistFilter:
+    """This process's Bloom filter of the blacklisted JTIs read from the database"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._version = None
+        self._last_id = 0
+        # Ids within SYNC_ID_OVERLAP of _last_id that are already in the filter
+        self._seen_ids = set()
+        # JTIs this process added before reading their rows back
+        self._local_jtis = set()
+        self._synced_at = 0
+        self._refreshing = False
+    
+    def might_contain(self, jti):
+        """False only if ``jti`` was certainly not blacklisted as of the current version"""
+        if not cache_is_shared():
+            return True
+        version = get_version(NAMESPACE)
+        if self._refresh_due(version):
+            background.submit(self._refresh)
+        with self._lock:
+            if self._filter is None or self._version != version:
+                # Not caught up yet; the table has the answer
+                return True
+            return jti in self._filter
+    
+    def blacklisted(self, jti):
+        """Add a JTI this process blacklisted and tell the other processes"""
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+                self._local_jtis.add(jti)
+        version = bump_version(NAMESPACE)
+        with self._lock:
+            # Nobody else bumped in between, so nothing else is missing
+            if self._version is not None and version == self._version + 1:
+                self._version = version
+    
+    def reset(self):
+        with self._lock:
+            self._filter = None
+    
+    def _refresh_due(self, version):
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = (
+                self._filter is None
+                or self._version != version
+                or self._filter.count > self._filter.capacity
+                or time.monotonic() - self._synced_at >= settings.TOKEN_BLACKLIST_SYNC_INTERVAL
+            )
+            return self._refreshing
+    
+    def _refresh(self):
+        try:
+            synced_at = time.monotonic()
+            version = get_version(NAMESPACE)
+            with self._lock:
+                rebuild = self._filter is None or self._filter.count > self._filter.capacity
+            if rebuild:
+                self._rebuild(version)
+            else:
+                self._sync(version)
+            self._synced_at = synced_at
+        finally:
+            self._refreshing = False
+    
+    def _rebuild(self, version):
+        bloom = BloomFilter(max(MIN_CAPACITY, 2 * BlacklistedToken.objects.count()))
+        recent_ids = deque(maxlen=SYNC_ID_OVERLAP)
+        for pk, jti in self._rows_after(0):
+            bloom.add(jti)
+            recent_ids.append(pk)
+        with self._lock:
+            self._filter, self._version = bloom, version
+            self._last_id, self._seen_ids, self._local_jtis = 0, set(), set()
+            self._remember(recent_ids)
+    
+    def _sync(self, version):
+        with self._lock:
+            last_id, seen_ids = self._last_id, self._seen_ids
+        rows = [(pk, jti) for pk, jti in self._rows_after(last_id - SYNC_ID_OVERLAP) if pk not in seen_ids]
+        with self._lock:
+            if self._filter is None:
+                return
+            for _, jti in rows:
+                if jti in self._local_jtis:
+                    self._local_jtis.discard(jti)
+                else:
+                    self._filter.add(jti)
+            self._version = version
+            self._remember([*self._seen_ids, *(pk for pk, _ in rows)])
+    
+    def _rows_after(self, pk):
+        rows = BlacklistedToken.objects.filter(pk__gt=pk).order_by("pk").values_list("pk", "token__jti")
+        return rows.iterator(chunk_size=LOAD_CHUNK_SIZE)
+    
+    def _remember(self, ids):
+        self._last_id = max([self._last_id, *ids])
+        self._seen_ids = {pk for pk in ids if pk > self._last_id - SYNC_ID_OVERLAP}
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class FilteredRefreshToken(RefreshToken):
+    """A RefreshToken that checks the Bloom filter before the blacklist table"""
+
+    def check_blacklist(self):
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        result = super().blacklist()
+        jti = self.payload[api_settings.JTI_CLAIM]
+        transaction.on_commit(lambda: blacklist_filter.blacklisted(jti))
+        return result
+
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
+
+def prune_expired_tokens(chunk_size=PRUNE_CHUNK_SIZE):
+    """Delete expired outstanding tokens (and their blacklist rows); returns how many"""
+    expired = OutstandingToken.objects.filter(expires_at__lte=timezone.now())
+    deleted = 0
+    while True:
+        ids = list(expired.order_by().values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            break
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+    if deleted:
+        blacklist_filter.reset()
+    return deleted
@@ -9,4 +9,5 @@ urlpatterns = [
     path("user/", views.UserProfileView.as_view(), name="user_profile"),
     path("stats/", views.UserStatsView.as_view(), name="user_stats"),
     path("activities/", views.user_activities_view, name="user_activities"),
+    path("leaderboard/", views.leaderboard_view, name="leaderboard"),
 ]
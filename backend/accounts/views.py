@@ -1,14 +1,22 @@
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
 from django.contrib.auth import authenticate
-from .models import User, UserActivity
+from django.core.cache import cache
+from django.utils import timezone
+from baltic_climate.images import derivative_urls
+from .activity import GRAPH_DAYS, contribution_graph, stats_key, stats_prefetches
+from .leaderboard import SCOPES, leaderboards
+from .models import User
 from .serializers import (
     UserRegistrationSerializer,
     UserLoginSerializer,
     UserProfileSerializer,
-    UserStatsSerializer
+    UserStatsSerializer,
+    ActivityStatsSerializer,
 )
 
 
@@ -53,44 +61,94 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self):
-        return self.request.user
+        # request.user may come from the auth cache, with stale counters
+        return User.objects.get(pk=self.request.user.pk)
 
 
 class UserStatsView(generics.RetrieveAPIView):
+    """The user's counters and rank, plus ``?days=`` (default 90) of activity.
+    
+    The activity part (window, achievements, streaks, monthly totals) is
+    cached per user and activity version; counters and rank are read fresh.
+    """
     serializer_class = UserStatsSerializer
     permission_classes = [permissions.IsAuthenticated]
+    DEFAULT_DAYS = 90
     
-    def get_object(self):
-        return self.request.user
+    def get_days(self):
+        try:
+            days = int(self.request.query_params.get("days", self.DEFAULT_DAYS))
+        except ValueError:
+            raise ValidationError({"days": "Expected an integer."})
+        if not 1 <= days <= GRAPH_DAYS:
+            raise ValidationError({"days": f"Expected 1 to {GRAPH_DAYS} days."})
+        return days
+    
+    def retrieve(self, request, *args, **kwargs):
+        days = self.get_days()
+        today = timezone.localdate()
+        key = stats_key(request.user.pk, days, today)
+        activity = cache.get(key)
+        
+        users = User.objects.all()
+        if activity is None:
+            users = users.prefetch_related(*stats_prefetches(today))
+        # request.user may come from the auth cache, with stale counters
+        user = users.get(pk=request.user.pk)
+        if activity is None:
+            activity = ActivityStatsSerializer(user, context={"days": days, "today": today}).data
+            cache.set(key, activity, settings.PROFILE_CACHE_TIMEOUT)
+        return Response({**self.get_serializer(user).data, **activity})
 
 
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated])
 def user_activities_view(request):
     """Get user activity data for contribution graph"""
-    user = request.user
-    
-    # Get activities for the last year
-    from datetime import date, timedelta
-    one_year_ago = date.today() - timedelta(days=365)
-    
-    activities = UserActivity.objects.filter(
-        user=user,
-        date__gte=one_year_ago
-    ).order_by("date")
-    
-    # Create a complete dataset with all dates
-    activity_data = []
-    current_date = one_year_ago
-    activity_dict = {activity.date: activity for activity in activities}
-    
-    while current_date <= date.today():
-        activity = activity_dict.get(current_date)
-        activity_data.append({
-            "date": current_date.isoformat(),
-            "action_count": activity.action_count if activity else 0,
-            "contribution_level": activity.contribution_level if activity else 0,
-        })
-        current_date += timedelta(days=1)
+    return Response(contribution_graph(request.user.pk))
+
+
+DEFAULT_LEADERBOARD_LIMIT = 20
+MAX_LEADERBOARD_LIMIT = 100
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def leaderboard_view(request):
+    """Get the top users by impact score, globally or for ?country= or ?month=YYYY-MM"""
+    params = request.query_params
+    scope = params.get("scope", "global")
+    if scope not in SCOPES:
+        raise ValidationError({"scope": f"Expected one of {', '.join(SCOPES)}."})
+    key = params.get(scope) if scope != "global" else None
+    if scope != "global" and not key:
+        raise ValidationError({scope: f"Required for the {scope} leaderboard."})
+    try:
+        limit = int(params.get("limit", DEFAULT_LEADERBOARD_LIMIT))
+    except ValueError:
+        raise ValidationError({"limit": "Expected an integer."})
+    if limit < 1:
+        raise ValidationError({"limit": "Expected a positive integer."})
+    limit = min(limit, MAX_LEADERBOARD_LIMIT)
     
-    return Response(activity_data)
+    entries = leaderboards.top(scope, key, limit)
+    users = User.objects.only("first_name", "last_name", "avatar_derivatives").in_bulk([user_id for _, user_id, _ in entries])
+    rank, score = leaderboards.standing(scope, key, request.user.pk)
+    return Response({
+        "scope": scope,
+        "key": key,
+        "results": [
+            {
+                "rank": entry_rank,
+                "score": entry_score,
+                "user": {
+                    "id": user_id,
+                    "full_name": users[user_id].full_name,
+                    "avatar_urls": derivative_urls(users[user_id].avatar_derivatives, request),
+                },
+            }
+            for entry_rank, user_id, entry_score in entries
+            if user_id in users
+        ],
+        "me": {"rank": rank, "score": score},
+    })
@@ -1,6 +1,23 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+from baltic_climate import background
 
 
 class ActionsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "actions"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        
+        post_migrate.connect(signals.ensure_search_index, sender=self)
+        
+        background.register_periodic(
+            "refresh_action_statuses", "ACTION_STATUS_REFRESH_INTERVAL", "actions.status.refresh_action_statuses"
+        )
+        background.register_periodic(
+            "refresh_recommendations",
+            "RECOMMENDATION_REFRESH_INTERVAL",
+            "actions.recommendations.refresh_shared_recommendations",
+        )
@@ -0,0 +1,112 @@
+"""Bulk import of climate actions from partner feeds and data files."""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from accounts.achievements import ORGANIZED, queue_achievement_check
+from accounts.leaderboard import record_points
+from accounts.models import User
+
+from .cache import bump_data_version
+from .live import publish
+from .models import ClimateAction
+from .serializers import ClimateActionCreateSerializer
+from .tags import sync_tags_bulk
+
+CHUNK_SIZE = 500
+
+
+def import_actions(rows, organizer=None, allow_organizer_email=True, chunk_size=CHUNK_SIZE):
+    """Validate ``rows`` like the create endpoint does and insert the valid ones.
+    
+    Each row is a dict of ``ClimateActionCreateSerializer`` fields plus an
+    optional ``organizer_email``; rows without one belong to ``organizer``.
+    Returns ``{"created": n, "errors": [{"row": index, "errors": {...}}]}``.
+    
+    Rows are inserted with ``bulk_create`` one chunk at a time, so the
+    per-instance signals do not run. Their side effects (tag index,
+    organizer counters, cache version, live events) are applied once per
+    chunk instead.
+    """
+    errors = []
+    emails = set()
+    if allow_organizer_email:
+        emails = {
+            row["organizer_email"].lower()
+            for row in rows
+            if isinstance(row, dict) and isinstance(row.get("organizer_email"), str)
+        }
+    organizers = {}
+    if emails:
+        users = User.objects.annotate(email_lower=Lower("email")).filter(email_lower__in=emails)
+        organizers = dict(users.values_list("email_lower", "pk"))
+    
+    # One serializer instance validates every row, so fields are built once
+    serializer = ClimateActionCreateSerializer()
+    created = 0
+    for offset in range(0, len(rows), chunk_size):
+        actions = []
+        for index, row in enumerate(rows[offset:offset + chunk_size], start=offset):
+            try:
+                action = _build_action(serializer, row, organizer, organizers, allow_organizer_email)
+            except ValidationError as exc:
+                errors.append({"row": index, "errors": exc.detail})
+            else:
+                actions.append(action)
+        if actions:
+            created += len(_insert(actions))
+    return {"created": created, "errors": errors}
+
+
+def _build_action(serializer, row, organizer, organizers, allow_organizer_email):
+    if not isinstance(row, dict):
+        raise ValidationError({"non_field_errors": ["Expected an object."]})
+    row = dict(row)
+    email = row.pop("organizer_email", None)
+    if email and not allow_organizer_email:
+        raise ValidationError({"organizer_email": ["You can only import actions you organize."]})
+    if email:
+        organizer_id = organizers.get(str(email).lower())
+        if organizer_id is None:
+            raise ValidationError({"organizer_email": [f"No user with email {email}."]})
+    elif organizer is not None:
+        organizer_id = organizer.pk
+    else:
+        raise ValidationError({"organizer_email": ["This field is required."]})
+    
+    action = ClimateAction(organizer_id=organizer_id, **serializer.run_validation(row))
+    # ClimateAction.save() is bypassed, so derive the status here
+    if action.status != "cancelled":
+        action.status = action.status_at(timezone.now())
+    return action
+
+
+@transaction.atomic
+def _insert(actions):
+    actions = ClimateAction.objects.bulk_create(actions)
+    sync_tags_bulk([action for action in actions if action.tags])
+    for organizer_id, count in Counter(action.organizer_id for action in actions).items():
+        User.objects.filter(pk=organizer_id).update(
+            actions_organized=F("actions_organized") + count,
+            impact_score=F("impact_score") + count * User.ORGANIZED_ACTION_POINTS,
+        )
+    for action in actions:
+        record_points(action.organizer_id, User.ORGANIZED_ACTION_POINTS, action.country, action.created_at)
+    queue_achievement_check({action.organizer_id for action in actions}, ORGANIZED)
+    bump_data_version()
+    # The same event push_action_change sends, built from the rows in hand
+    for action in actions:
+        publish({
+            "type": "action",
+            "action": action.pk,
+            "latitude": action.latitude,
+            "longitude": action.longitude,
+            "status": action.status,
+            "participant_count": action.participant_count,
+        })
+    return actions
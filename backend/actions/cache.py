@@ -0,0 +1,22 @@
+"""Versioned caching for climate action read endpoints.
+
+Every cached payload is keyed by a global data version. Writes to actions or
+participations bump the version, which orphans all previously cached entries
+at once instead of having to track and delete individual keys.
+"""
+
+from baltic_climate import cache as versioned_cache
+
+NAMESPACE = "actions"
+
+
+def get_data_version():
+    return versioned_cache.get_version(NAMESPACE)
+
+
+def bump_data_version():
+    versioned_cache.bump_version(NAMESPACE)
+
+
+def versioned_key(*parts):
+    return versioned_cache.versioned_key(NAMESPACE, *parts)
@@ -0,0 +1,64 @@
+"""Per-day views of actions overlapping a date window."""
+
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+MAX_CALENDAR_DAYS = 92
+CALENDAR_FIELDS = (
+    "id", "title", "action_type", "status", "start_date", "end_date",
+    "location_name", "city", "country", "latitude", "longitude",
+)
+
+
+def _window_bounds(first_day, last_day):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(first_day, time.min), tz)
+    end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def calendar(queryset, first_day, last_day):
+    """Actions overlapping ``[first_day, last_day]`` and per-day counts.
+    
+    Counts are a sweep over three grouped queries (actions already running
+    when the window opens, starts per day and ends per day), so the work is
+    proportional to the number of days rather than each action's length.
+    Actions are grouped under the day they first appear in the window.
+    """
+    window_start, window_end = _window_bounds(first_day, last_day)
+    overlapping = queryset.filter(start_date__lt=window_end, end_date__gte=window_start).order_by()
+    
+    running = overlapping.filter(start_date__lt=window_start).count()
+    starts = dict(
+        overlapping.filter(start_date__gte=window_start)
+        .annotate(day=TruncDate("start_date"))
+        .values("day")
+        .annotate(total=Count("pk"))
+        .values_list("day", "total")
+    )
+    ends = dict(
+        overlapping.filter(end_date__lt=window_end)
+        .annotate(day=TruncDate("end_date"))
+        .values("day")
+        .annotate(total=Count("pk"))
+        .values_list("day", "total")
+    )
+    
+    actions = list(overlapping.order_by("start_date", "id").values(*CALENDAR_FIELDS))
+    starting = {}
+    for action in actions:
+        first_visible = max(timezone.localdate(action["start_date"]), first_day)
+        starting.setdefault(first_visible, []).append(action["id"])
+    
+    days = []
+    day = first_day
+    while day <= last_day:
+        running += starts.get(day, 0)
+        days.append({"date": day.isoformat(), "count": running, "starting": starting.get(day, [])})
+        running -= ends.get(day, 0)
+        day += timedelta(days=1)
+    
+    return {"from": first_day.isoformat(), "to": last_day.isoformat(), "days": days, "actions": actions}
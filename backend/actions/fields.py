@@ -0,0 +1,19 @@
+from django.db import models
+
+
+class SearchDocumentField(models.TextField):
+    """The hidden FTS5 column that shares its table's name.
+    
+    SQLite full-text queries and ranking functions take this column as their
+    target, so it supports a ``match`` lookup (``document__match=...``).
+    """
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = "match"
+    
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
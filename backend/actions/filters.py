@@ -0,0 +1,136 @@
+"""Query-parameter filtering shared by the action list and facet endpoints."""
+
+from django.db import models
+from rest_framework.exceptions import ValidationError
+
+from .geo import filter_near
+from .models import ClimateAction
+from .search import search_actions
+from .status import current_status, status_q, upcoming_q
+from .tags import normalize_tag
+
+DEFAULT_NEAR_RADIUS_KM = 25
+MAX_NEAR_RADIUS_KM = 1000
+
+# Facet query parameter -> model field. Repeating a parameter selects any
+# of the given values.
+FACETS = {
+    "type": "action_type",
+    # Annotated by current_status(); the stored status can lag the dates
+    "status": "current_status",
+    "country": "country",
+}
+OTHER_FILTERS = ("location", "tag", "upcoming", "q", "near", "radius_km")
+
+
+def filter_actions(queryset, params):
+    """Apply every list filter in ``params`` and the matching ordering"""
+    return filter_common(filter_facets(queryset, params), params)
+
+
+def filter_facets(queryset, params):
+    for param, field in FACETS.items():
+        values = params.getlist(param)
+        if values:
+            # The date conditions use the date indexes, unlike the annotation
+            condition = status_q(values) if param == "status" else models.Q(**{f"{field}__in": values})
+            queryset = queryset.filter(condition)
+    return queryset
+
+
+def filter_common(queryset, params):
+    """Apply the non-facet filters; search and proximity also set the ordering"""
+    # Filter by location
+    location = params.get("location")
+    if location:
+        queryset = queryset.filter(
+            models.Q(city__icontains=location) | 
+            models.Q(country__icontains=location)
+        )
+    
+    # Filter by tag; repeating the parameter requires every tag
+    for tag in params.getlist("tag"):
+        queryset = queryset.filter(normalized_tags__name=normalize_tag(tag))
+    
+    # Filter upcoming events
+    upcoming = params.get("upcoming")
+    if upcoming == "true":
+        queryset = queryset.filter(upcoming_q())
+    
+    # Full-text search, best matches first
+    query = params.get("q")
+    if query:
+        queryset = search_actions(queryset, query)
+    
+    # Filter by distance from a point, nearest first
+    near = params.get("near")
+    if near:
+        latitude, longitude, radius_km = parse_near(near, params.get("radius_km", DEFAULT_NEAR_RADIUS_KM))
+        return filter_near(queryset, latitude, longitude, radius_km)
+    
+    if query:
+        return queryset
+    return queryset.order_by("start_date")
+
+
+def parse_near(near, radius_km):
+    try:
+        latitude, longitude = (float(value) for value in near.split(","))
+        radius_km = float(radius_km)
+    except ValueError:
+        raise ValidationError({"near": "Expected near=<lat>,<lng> and a numeric radius_km."})
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or not 0 < radius_km <= MAX_NEAR_RADIUS_KM:
+        raise ValidationError({"near": f"Coordinates out of range or radius_km not in (0, {MAX_NEAR_RADIUS_KM}]."})
+    return latitude, longitude, radius_km
+
+
+def facet_counts(queryset, params):
+    """Counts per action type, status and country for the filter chips.
+    
+    Faceting is disjunctive: each facet's counts apply every active filter
+    except that facet's own selection, so picking one type still shows how
+    many actions the other types would add. All facets come from a single
+    GROUP BY over the three fields, narrowed only by the non-facet filters.
+    """
+    groups = list(
+        filter_common(queryset, params)
+        .annotate(current_status=current_status())
+        .order_by()
+        .values(*FACETS.values())
+        .annotate(count=models.Count("pk"))
+    )
+    selected = {field: set(params.getlist(param)) for param, field in FACETS.items()}
+    
+    def matches(group, skip_field=None):
+        return all(
+            not values or group[field] in values
+            for field, values in selected.items()
+            if field != skip_field
+        )
+    
+    labels = {
+        "action_type": dict(ClimateAction.ACTION_TYPES),
+        "current_status": dict(ClimateAction.STATUS_CHOICES),
+    }
+    data = {"total": sum(group["count"] for group in groups if matches(group))}
+    for param, field in FACETS.items():
+        counts = dict.fromkeys(selected[field], 0)
+        for group in groups:
+            if matches(group, skip_field=field):
+                counts[group[field]] = counts.get(group[field], 0) + group["count"]
+        field_labels = labels.get(field, {})
+        data[param] = [
+            {"value": value, "label": field_labels.get(value, value), "count": count}
+            for value, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+            if count or value in selected[field]
+        ]
+    return data
+
+
+def cache_key_parts(params, names=(*FACETS, *OTHER_FILTERS)):
+    """Canonical, order-independent representation of the filter parameters in ``names``"""
+    return [
+        f"{param}={','.join(sorted(params.getlist(param)))}"
+        for param in sorted(names)
+        if params.getlist(param)
+    ]
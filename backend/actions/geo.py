@@ -0,0 +1,53 @@
+"""Great-circle distance helpers for proximity search on actions."""
+
+import math
+
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Latitude/longitude ranges that contain every point within ``radius_km``.
+    
+    Returns ``(min_lat, max_lat, min_lng, max_lng)``; the longitude bounds are
+    ``None`` when the box would wrap around a pole or the antimeridian.
+    """
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = latitude - lat_delta, latitude + lat_delta
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None, None
+    
+    lng_delta = math.degrees(math.asin(math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude))))
+    min_lng, max_lng = longitude - lng_delta, longitude + lng_delta
+    if min_lng < -180 or max_lng > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lng, max_lng
+
+
+def haversine_km(latitude, longitude, lat_field="latitude", lng_field="longitude"):
+    """Database expression for the distance in km from a fixed point to each row"""
+    half_dlat = Radians(F(lat_field) - Value(latitude)) / 2
+    half_dlng = Radians(F(lng_field) - Value(longitude)) / 2
+    a = Power(Sin(half_dlat), 2) + Value(math.cos(math.radians(latitude))) * Cos(Radians(F(lat_field))) * Power(
+        Sin(half_dlng), 2
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a), output_field=FloatField())
+
+
+def filter_near(queryset, latitude, longitude, radius_km):
+    """Rows within ``radius_km``, annotated with ``distance_km`` and nearest first.
+    
+    The bounding box lets the (latitude, longitude) index discard most rows
+    before the exact haversine distance is evaluated for the rest.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    queryset = queryset.filter(latitude__range=(min_lat, max_lat))
+    if min_lng is not None:
+        queryset = queryset.filter(longitude__range=(min_lng, max_lng))
+    return (
+        queryset.annotate(distance_km=haversine_km(latitude, longitude))
+        .filter(distance_km__lte=radius_km)
+        .order_by("distance_km", "start_date")
+    )
@@ -0,0 +1,183 @@
+"""Live action deltas pushed to subscribed clients.
+
+Writes publish small events (participant counts, new updates, status
+changes) to a broker, and the ``stream/`` endpoint relays the ones a
+client subscribed to as server-sent events. The broker is chosen by the
+``LIVE_UPDATES_BROKER`` setting. The default ``InProcessBroker`` only
+reaches clients connected to the same process. A multi-process
+deployment can plug in a broker that relays ``publish()`` through a
+shared channel (e.g. Redis pub/sub) into each process's local
+subscribers.
+
+Every event carries the action id and coordinates so that map
+subscriptions can be matched against their bounding box.
+"""
+
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import ValidationError
+
+from .models import ClimateAction
+
+MAX_STREAM_ACTIONS = 50
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class Subscription:
+    """Events for some actions and/or a map area, queued for one client"""
+    
+    def __init__(self, action_ids=(), bbox=None, loop=None, maxsize=None):
+        self.action_ids = frozenset(action_ids)
+        self.bbox = bbox
+        self.loop = loop or asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize or settings.LIVE_UPDATES_QUEUE_SIZE)
+    
+    def matches(self, event):
+        if event["action"] in self.action_ids:
+            return True
+        if self.bbox is None:
+            return False
+        south, west, north, east = self.bbox
+        return south <= event["latitude"] <= north and west <= event["longitude"] <= east
+    
+    def deliver(self, event):
+        """Queue ``event`` from any thread"""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The client's event loop has shut down; it is about to unsubscribe
+            pass
+    
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The client fell behind; drop the backlog and tell it to refetch
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+    
+    async def get(self):
+        return await self.queue.get()
+
+
+class InProcessBroker:
+    """Fans events out to subscriptions held by this process.
+    
+    Action subscriptions are indexed by action id; map subscriptions are
+    checked against each event's coordinates.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_action = {}
+        self._by_area = set()
+    
+    def subscribe(self, subscription):
+        with self._lock:
+            for action_id in subscription.action_ids:
+                self._by_action.setdefault(action_id, set()).add(subscription)
+            if subscription.bbox is not None:
+                self._by_area.add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for action_id in subscription.action_ids:
+                subscribers = self._by_action.get(action_id, set())
+                subscribers.discard(subscription)
+                if not subscribers:
+                    self._by_action.pop(action_id, None)
+            self._by_area.discard(subscription)
+    
+    def subscriber_count(self):
+        with self._lock:
+            return len({sub for subs in self._by_action.values() for sub in subs} | self._by_area)
+    
+    def publish(self, event):
+        with self._lock:
+            candidates = self._by_action.get(event["action"], set()) | self._by_area
+        for subscription in candidates:
+            if subscription.matches(event):
+                subscription.deliver(event)
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.LIVE_UPDATES_BROKER)()
+        return _broker
+
+
+def publish(event):
+    """Publish a complete event once the current transaction commits"""
+    transaction.on_commit(lambda: get_broker().publish(event))
+
+
+def publish_action_event(action_id, event_type, **data):
+    """Publish an event about ``action_id`` once the current transaction commits.
+    
+    The action's location and participant count are read at commit time, so
+    subscribers always see committed numbers.
+    """
+    def send():
+        row = ClimateAction.objects.filter(pk=action_id).values(
+            "latitude", "longitude", "status", "participant_count"
+        ).first()
+        if row is not None:
+            get_broker().publish({"type": event_type, "action": action_id, **row, **data})
+    
+    transaction.on_commit(send)
+
+
+def subscription_from_params(params):
+    """A Subscription for ``?action=<id>`` (repeatable) and/or ``?bbox=south,west,north,east``"""
+    try:
+        action_ids = {int(value) for value in params.getlist("action")}
+    except ValueError:
+        raise ValidationError({"action": "Expected action ids."})
+    if len(action_ids) > MAX_STREAM_ACTIONS:
+        raise ValidationError({"action": f"At most {MAX_STREAM_ACTIONS} actions per stream."})
+    
+    bbox = None
+    if params.get("bbox"):
+        try:
+            bbox = tuple(float(value) for value in params["bbox"].split(","))
+        except ValueError:
+            bbox = ()
+        if len(bbox) != 4 or not (-90 <= bbox[0] <= bbox[2] <= 90 and -180 <= bbox[1] <= bbox[3] <= 180):
+            raise ValidationError({"bbox": "Expected bbox=<south>,<west>,<north>,<east>."})
+    
+    if not action_ids and bbox is None:
+        raise ValidationError({"action": "Subscribe to at least one action or a bbox."})
+    return Subscription(action_ids, bbox)
+
+
+def format_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def event_stream(subscription):
+    """Server-sent events for ``subscription`` until the client disconnects"""
+    broker = get_broker()
+    broker.subscribe(subscription)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), settings.LIVE_UPDATES_KEEPALIVE)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
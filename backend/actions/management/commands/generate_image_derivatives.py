@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from baltic_climate.images import IMAGE_FIELDS, generate_for
+
+
+def _generate(model_label, pk):
+    try:
+        return generate_for(model_label, pk)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Generate missing resized derivatives for action images and user avatars"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Images to process in parallel; 1 runs in-process")
+        parser.add_argument("--force", action="store_true", help="Regenerate manifests that look current")
+
+    def handle(self, *args, **options):
+        jobs = []
+        for model_label, (image_field, manifest_field) in IMAGE_FIELDS.items():
+            model = apps.get_model(model_label)
+            rows = model.objects.exclude(**{f"{image_field}__isnull": True}).exclude(**{image_field: ""})
+            for pk, image, manifest in rows.values_list("pk", image_field, manifest_field).iterator():
+                if options["force"] or (manifest or {}).get("source") != image:
+                    jobs.append((model_label, pk))
+
+        failed = 0
+        if options["workers"] <= 1:
+            for model_label, pk in jobs:
+                try:
+                    generate_for(model_label, pk)
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{model_label} {pk}: {exc}")
+        else:
+            with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                futures = {pool.submit(_generate, *job): job for job in jobs}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as exc:
+                        failed += 1
+                        model_label, pk = futures[future]
+                        self.stderr.write(f"{model_label} {pk}: {exc}")
+        
+        self.stdout.write(self.style.SUCCESS(f"Generated derivatives for {len(jobs) - failed} of {len(jobs)} images"))
@@ -0,0 +1,50 @@
+import csv
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from actions.bulk import CHUNK_SIZE, import_actions
+
+
+def read_rows(path):
+    """Rows from a JSON array, JSON Lines or CSV file, picked by extension"""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.suffix == ".csv":
+            # Empty cells mean "not given" rather than an empty value
+            return [{key: value for key, value in row.items() if value != ""} for row in csv.DictReader(f)]
+        if path.suffix == ".jsonl":
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+    return data.get("actions", []) if isinstance(data, dict) else data
+
+
+class Command(BaseCommand):
+    help = "Import climate actions from a JSON, JSON Lines or CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=Path)
+        parser.add_argument("--organizer", help="Email of the organizer for rows without organizer_email")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows validated and inserted per batch")
+
+    def handle(self, *args, **options):
+        try:
+            rows = read_rows(options["path"])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Could not read {options['path']}: {exc}")
+        if not isinstance(rows, list):
+            raise CommandError("Expected a list of actions")
+        
+        organizer = None
+        if options["organizer"]:
+            organizer = User.objects.filter(email__iexact=options["organizer"]).first()
+            if organizer is None:
+                raise CommandError(f"No user with email {options['organizer']}")
+        
+        result = import_actions(rows, organizer=organizer, chunk_size=options["chunk_size"])
+        for error in result["errors"]:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['created']} of {len(rows)} actions ({len(result['errors'])} rejected)"
+        ))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from actions.status import refresh_action_statuses
+
+
+class Command(BaseCommand):
+    help = "Move actions between upcoming, ongoing and completed according to their dates"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Keep running and refresh every INTERVAL seconds instead of once",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            moved = refresh_action_statuses()
+            summary = ", ".join(f"{count} {status}" for status, count in moved.items())
+            self.stdout.write(self.style.SUCCESS(f"Refreshed action statuses: {summary}"))
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from actions.recommendations import BATCH_SIZE, refresh_recommendations
+from baltic_climate.cache import cache_is_shared
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's recommended actions and cache them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Users scored per matrix batch")
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            self.stderr.write(self.style.WARNING(
+                "The cache is process-local, so web processes will not see these rankings; "
+                "they refresh their own instead. Configure a shared cache to refresh them here."
+            ))
+        started = time.monotonic()
+        users = refresh_recommendations(batch_size=options["batch_size"])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Refreshed recommendations for {users} users in {elapsed:.1f}s"))
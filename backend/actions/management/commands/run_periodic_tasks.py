@@ -0,0 +1,38 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from baltic_climate.background import registered_periodic_tasks, schedule
+
+
+class Command(BaseCommand):
+    help = "Run the periodic tasks whose interval setting is non-zero, until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run each enabled task once and exit")
+
+    def handle(self, *args, **options):
+        enabled = [
+            (name, getattr(settings, interval_setting), import_string(func_path))
+            for name, (interval_setting, func_path) in sorted(registered_periodic_tasks().items())
+            if getattr(settings, interval_setting)
+        ]
+        if not enabled:
+            self.stdout.write("No periodic tasks are enabled; set their *_INTERVAL settings.")
+            return
+
+        for name, interval, func in enabled:
+            if options["once"]:
+                func()
+                self.stdout.write(self.style.SUCCESS(f"Ran {name}"))
+            else:
+                schedule(name, interval, func)
+                self.stdout.write(f"Running {name} every {interval}s")
+        if options["once"]:
+            return
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from actions.models import ActionUpdate
+from actions.notifications import send_update_notifications
+
+
+class Command(BaseCommand):
+    help = "Email participants about action updates they have not been sent yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("update_ids", nargs="*", type=int, help="Updates to send (default: recent ones)")
+        parser.add_argument("--days", type=int, default=2, help="How far back to look for recent updates")
+
+    def handle(self, *args, **options):
+        update_ids = options["update_ids"]
+        if not update_ids:
+            since = timezone.now() - timedelta(days=options["days"])
+            update_ids = ActionUpdate.objects.filter(created_at__gte=since).values_list("pk", flat=True)
+        sent = sum(send_update_notifications(update_id) for update_id in update_ids)
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} update notifications"))
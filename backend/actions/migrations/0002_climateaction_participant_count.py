@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-19 17:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_participant_counts(apps, schema_editor):
+    ClimateAction = apps.get_model("actions", "ClimateAction")
+    ActionParticipation = apps.get_model("actions", "ActionParticipation")
+    counts = (
+        ActionParticipation.objects.filter(action=OuterRef("pk"))
+        .order_by()
+        .values("action")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    ClimateAction.objects.update(participant_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="climateaction",
+            name="participant_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_participant_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-19 17:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions", "0002_climateaction_participant_count"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="climateaction",
+            index=models.Index(fields=["latitude", "longitude"], name="action_location_idx"),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-19 17:07
+
+import actions.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def install_search_index(apps, schema_editor):
+    from actions.search import install_search_index
+
+    install_search_index(schema_editor, apps.get_model("actions", "ClimateAction"))
+
+
+def uninstall_search_index(apps, schema_editor):
+    from actions.search import uninstall_search_index
+
+    uninstall_search_index(schema_editor, apps.get_model("actions", "ClimateAction"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions", "0003_climateaction_location_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClimateActionSearchEntry",
+            fields=[
+                (
+                    "action",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_entry",
+                        serialize=False,
+                        to="actions.climateaction",
+                    ),
+                ),
+                ("document", actions.fields.SearchDocumentField(db_column="actions_climateaction_fts")),
+            ],
+            options={
+                "db_table": "actions_climateaction_fts",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-19 17:08
+
+from django.db import migrations, models
+
+
+def backfill_tags(apps, schema_editor):
+    ClimateAction = apps.get_model("actions", "ClimateAction")
+    ActionTag = apps.get_model("actions", "ActionTag")
+    Through = ClimateAction.normalized_tags.through
+
+    names_by_action = {}
+    for action_id, tags in ClimateAction.objects.exclude(tags="").values_list("id", "tags").iterator():
+        names = (" ".join(tag.split()).lower()[:50] for tag in tags.split(","))
+        names_by_action[action_id] = list(dict.fromkeys(name for name in names if name))
+
+    all_names = {name for names in names_by_action.values() for name in names}
+    ActionTag.objects.bulk_create([ActionTag(name=name) for name in all_names], ignore_conflicts=True)
+    tag_ids = dict(ActionTag.objects.values_list("name", "id"))
+    Through.objects.bulk_create(
+        [
+            Through(climateaction_id=action_id, actiontag_id=tag_ids[name])
+            for action_id, names in names_by_action.items()
+            for name in names
+        ],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions", "0004_full_text_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ActionTag",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                "verbose_name": "Action Tag",
+                "verbose_name_plural": "Action Tags",
+                "ordering": ["name"],
+            },
+        ),
+        migrations.AddField(
+            model_name="climateaction",
+            name="normalized_tags",
+            field=models.ManyToManyField(blank=True, editable=False, related_name="actions", to="actions.actiontag"),
+        ),
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+    ]
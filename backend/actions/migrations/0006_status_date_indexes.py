@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-19 17:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def refresh_statuses(apps, schema_editor):
+    ClimateAction = apps.get_model("actions", "ClimateAction")
+    now = timezone.now()
+    active = ClimateAction.objects.exclude(status="cancelled")
+    active.filter(start_date__gt=now).update(status="upcoming")
+    active.filter(start_date__lte=now, end_date__gte=now).update(status="ongoing")
+    active.filter(end_date__lt=now).update(status="completed")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions", "0005_action_tags"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="climateaction",
+            index=models.Index(fields=["status", "start_date"], name="action_status_start_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="climateaction",
+            index=models.Index(fields=["start_date"], name="action_start_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="climateaction",
+            index=models.Index(fields=["end_date"], name="action_end_idx"),
+        ),
+        migrations.RunPython(refresh_statuses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 17:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions", "0006_status_date_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="climateaction",
+            name="action_start_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="climateaction",
+            name="action_end_idx",
+        ),
+        migrations.AddIndex(
+            model_name="climateaction",
+            index=models.Index(fields=["start_date", "end_date"], name="action_start_end_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="climateaction",
+            index=models.Index(fields=["end_date", "start_date"], name="action_end_start_idx"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions", "0007_interval_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="climateaction",
+            name="image_derivatives",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
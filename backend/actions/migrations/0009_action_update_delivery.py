@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 17:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions", "0008_climateaction_image_derivatives"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ActionUpdateDelivery",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("sent_at", models.DateTimeField(auto_now_add=True)),
+                ("update", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="deliveries", to="actions.actionupdate")),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="update_deliveries", to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "verbose_name": "Action Update Delivery",
+                "verbose_name_plural": "Action Update Deliveries",
+                "constraints": [models.UniqueConstraint(fields=("update", "user"), name="unique_update_delivery")],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-19 18:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("actions", "0009_action_update_delivery"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="actionupdatedelivery",
+            name="claim",
+            field=models.CharField(blank=True, help_text="Token of the job that claimed the delivery", max_length=32),
+        ),
+        migrations.AddField(
+            model_name="actionupdatedelivery",
+            name="claimed_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name="actionupdatedelivery",
+            name="sent_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
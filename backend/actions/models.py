@@ -2,8 +2,26 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 
+from baltic_climate.counters import CounterFieldsMixin
 
-class ClimateAction(models.Model):
+from .fields import SearchDocumentField
+
+
+class ActionTag(models.Model):
+    """Normalized tag shared by climate actions"""
+    
+    name = models.CharField(max_length=50, unique=True)
+    
+    class Meta:
+        ordering = ["name"]
+        verbose_name = "Action Tag"
+        verbose_name_plural = "Action Tags"
+    
+    def __str__(self):
+        return self.name
+
+
+class ClimateAction(CounterFieldsMixin, models.Model):
     """Climate action events and initiatives"""
     
     ACTION_TYPES = [
@@ -58,21 +76,53 @@ class ClimateAction(models.Model):
     
     # Content
     image = models.ImageField(upload_to="action_images/", blank=True, null=True)
+    # Resized copies of ``image``, maintained by baltic_climate.images
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     tags = models.CharField(max_length=500, blank=True, help_text="Comma-separated tags")
+    # Indexed copy of ``tags``, kept in sync on save by actions.tags
+    normalized_tags = models.ManyToManyField(ActionTag, related_name="actions", blank=True, editable=False)
     
     # Impact tracking
     expected_impact = models.TextField(blank=True)
     actual_impact = models.TextField(blank=True)
     impact_score = models.PositiveIntegerField(default=0)
     
+    # Denormalized number of ActionParticipation rows, kept in sync by
+    # reserve_seat() and the participation signals
+    participant_count = models.PositiveIntegerField(default=0, editable=False)
+    
     class Meta:
         ordering = ["start_date"]
+        indexes = [
+            models.Index(fields=["latitude", "longitude"], name="action_location_idx"),
+            models.Index(fields=["status", "start_date"], name="action_status_start_idx"),
+            # Interval lookups: a window [a, b) overlaps actions with
+            # start_date < b and end_date >= a, answered from either side
+            models.Index(fields=["start_date", "end_date"], name="action_start_end_idx"),
+            models.Index(fields=["end_date", "start_date"], name="action_end_start_idx"),
+        ]
         verbose_name = "Climate Action"
         verbose_name_plural = "Climate Actions"
     
+    # Kept by reserve_seat() and actions.signals with UPDATEs, never by save()
+    COUNTER_FIELDS = ("participant_count",)
+    
     def __str__(self):
         return f"{self.title} - {self.start_date.strftime('%Y-%m-%d')}"
     
+    def save(self, *args, **kwargs):
+        # Store the status the dates imply; actions.status keeps it current
+        if self.status != "cancelled":
+            self.status = self.status_at(timezone.now())
+        super().save(*args, **kwargs)
+    
+    def status_at(self, now):
+        if self.start_date > now:
+            return "upcoming"
+        if self.end_date < now:
+            return "completed"
+        return "ongoing"
+    
     @property
     def is_upcoming(self):
         return self.start_date > timezone.now()
@@ -85,9 +135,43 @@ class ClimateAction(models.Model):
     def is_completed(self):
         return self.end_date < timezone.now()
     
-    @property
-    def participant_count(self):
-        return self.participants.count()
+    def reserve_seat(self):
+        """Atomically take a participant slot, returning False when the action is full.
+        
+        The capacity check and the increment happen in a single conditional
+        UPDATE so concurrent registrations can never oversubscribe the action.
+        """
+        has_room = (
+            models.Q(max_participants__isnull=True)
+            | models.Q(max_participants=0)
+            | models.Q(participant_count__lt=models.F("max_participants"))
+        )
+        reserved = ClimateAction.objects.filter(has_room, pk=self.pk).update(
+            participant_count=models.F("participant_count") + 1
+        )
+        return reserved == 1
+
+
+class ClimateActionSearchEntry(models.Model):
+    """Full-text index row of a climate action (SQLite FTS5 virtual table)
+    
+    The table and the triggers that keep it in sync are managed by
+    ``actions.search``; the model only lets searches join it via the ORM.
+    """
+    
+    action = models.OneToOneField(
+        ClimateAction,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        related_name="search_entry",
+    )
+    document = SearchDocumentField(db_column="actions_climateaction_fts")
+    
+    class Meta:
+        managed = False
+        db_table = "actions_climateaction_fts"
 
 
 class ActionParticipation(models.Model):
@@ -178,3 +262,23 @@ class ActionUpdate(models.Model):
     
     def __str__(self):
         return f"{self.title} - {self.action.title}"
+
+
+class ActionUpdateDelivery(models.Model):
+    """An ActionUpdate email to one participant, claimed by the job sending it"""
+    
+    update = models.ForeignKey(ActionUpdate, on_delete=models.CASCADE, related_name="deliveries")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="update_deliveries")
+    claim = models.CharField(max_length=32, blank=True, help_text="Token of the job that claimed the delivery")
+    claimed_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["update", "user"], name="unique_update_delivery"),
+        ]
+        verbose_name = "Action Update Delivery"
+        verbose_name_plural = "Action Update Deliveries"
+    
+    def __str__(self):
+        return f"{self.update.title} -> {self.user.username}"
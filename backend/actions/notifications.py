@@ -0,0 +1,121 @@
+"""Email participants about new updates to their actions.
+
+Each update is fanned out by one background job. The job looks up every
+recipient still owed the email in a single query and sends in batches
+over one SMTP connection.
+
+Before sending a batch the job claims its deliveries: it inserts one
+``ActionUpdateDelivery`` per recipient, skipping those another job
+already holds, and mails only the rows that carry its own claim token.
+Jobs running at once (the post_save fan-out and
+``send_update_notifications``, or two runs of the command) therefore
+never mail anyone twice. Messages go out one per call, and claimed rows
+get ``sent_at`` once their batch is sent. If sending fails partway, the
+rows that went out are marked sent and the rest are given back. A claim
+left unsent for ``CLAIM_TIMEOUT`` (its job died) can be taken over with a
+conditional update, so running the job again only mails the people who
+were missed.
+"""
+
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from accounts.models import User
+from baltic_climate import background
+
+from .models import ActionUpdate, ActionUpdateDelivery
+
+NOTIFIED_PARTICIPATION_TYPES = ("registered", "attended", "completed")
+CLAIM_TIMEOUT = timedelta(minutes=30)
+
+
+def pending_recipients(update):
+    """(id, email, first name) of participants who have not had ``update`` yet, nor a live claim on it"""
+    delivered = ActionUpdateDelivery.objects.filter(
+        Q(sent_at__isnull=False) | Q(claimed_at__gte=timezone.now() - CLAIM_TIMEOUT),
+        update=update,
+        user=OuterRef("pk"),
+    )
+    return (
+        User.objects.filter(
+            participations__action_id=update.action_id,
+            participations__participation_type__in=NOTIFIED_PARTICIPATION_TYPES,
+            email_notifications=True,
+            is_active=True,
+        )
+        .exclude(email="")
+        .exclude(pk=update.created_by_id)
+        .exclude(Exists(delivered))
+        .order_by("pk")
+        .values_list("pk", "email", "first_name")
+    )
+
+
+def build_message(update, email, first_name, connection):
+    subject = f"{update.action.title}: {update.title}"
+    if update.is_important:
+        subject = f"[Important] {subject}"
+    greeting = f"Hi {first_name}," if first_name else "Hi,"
+    body = f"{greeting}\n\n{update.content}\n\nYou are receiving this because you joined {update.action.title}."
+    return EmailMessage(subject, body, to=[email], connection=connection)
+
+
+def claim_deliveries(update, user_ids, token):
+    """Claim the unsent deliveries of ``update`` to ``user_ids`` and return the ids this job got"""
+    now = timezone.now()
+    ActionUpdateDelivery.objects.bulk_create(
+        [ActionUpdateDelivery(update=update, user_id=user_id, claim=token, claimed_at=now) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    unsent = ActionUpdateDelivery.objects.filter(update=update, user_id__in=user_ids, sent_at__isnull=True)
+    # Only one job's conditional update can match an abandoned claim
+    unsent.filter(claimed_at__lt=now - CLAIM_TIMEOUT).update(claim=token, claimed_at=now)
+    return set(unsent.filter(claim=token).values_list("user_id", flat=True))
+
+
+def send_update_notifications(update_id):
+    """Email everyone still owed ``update_id`` and return how many were sent"""
+    update = ActionUpdate.objects.select_related("action").filter(pk=update_id).first()
+    if update is None:
+        return 0
+    recipients = list(pending_recipients(update))
+    if not recipients:
+        return 0
+    
+    batch_size = settings.ACTION_UPDATE_EMAIL_BATCH_SIZE
+    token = uuid.uuid4().hex
+    claimed = ActionUpdateDelivery.objects.filter(update=update, claim=token, sent_at__isnull=True)
+    sent = 0
+    with get_connection() as connection:
+        for start in range(0, len(recipients), batch_size):
+            batch = recipients[start:start + batch_size]
+            user_ids = claim_deliveries(update, [user_id for user_id, _, _ in batch], token)
+            if not user_ids:
+                continue
+            sent_ids = []
+            try:
+                for user_id, email, name in batch:
+                    if user_id in user_ids:
+                        # One message per call, so a failure leaves no doubt about which went out
+                        connection.send_messages([build_message(update, email, name, connection)])
+                        sent_ids.append(user_id)
+            except Exception:
+                # Keep what was sent and give the rest back so the next run retries it
+                claimed.filter(user_id__in=sent_ids).update(sent_at=timezone.now())
+                claimed.delete()
+                raise
+            claimed.update(sent_at=timezone.now())
+            sent += len(sent_ids)
+    return sent
+
+
+def queue_update_notifications(update):
+    """Fan ``update`` out on the background pool once it is committed"""
+    update_id = update.pk
+    transaction.on_commit(lambda: background.submit(send_update_notifications, update_id))
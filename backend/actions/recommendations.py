@@ -0,0 +1,280 @@
+"""Personalised ranking of upcoming actions.
+
+``refresh_recommendations`` scores every upcoming action for every user
+with NumPy, a batch of users at a time, and caches each user's top-N
+action ids. A request then only reads one cache entry and fetches those
+actions. A user's score for an action is a weighted sum of:
+
+- affinity: the share of the user's past actions that had the same type,
+- proximity: ``exp(-distance / DISTANCE_SCALE_KM)`` from the user's home,
+  which is the mean location of the actions they joined or organized, or
+  else the centre of the city named in their profile,
+- popularity: the action's participant count on a log scale.
+
+Users with no history and no known city get the global popularity list.
+
+The rankings are normally computed by ``manage.py run_periodic_tasks`` or
+``manage.py refresh_recommendations`` and shared with the web processes
+through the cache. A process-local cache (the default LocMemCache) would
+keep them inside the command's process. So with such a cache each web
+process computes its own on the background pool, on first use and then
+every ``RECOMMENDATION_REFRESH_INTERVAL`` seconds, or every
+``RECOMMENDATION_CACHE_TIMEOUT`` when that is 0. Until the first run
+finishes its users get the popular actions.
+"""
+
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Sum
+from django.db.models.functions import Lower
+
+from accounts.models import User
+from baltic_climate import background
+from baltic_climate.cache import cache_is_shared
+
+from .geo import EARTH_RADIUS_KM
+from .models import ActionParticipation, ClimateAction
+from .status import upcoming_q
+
+logger = logging.getLogger(__name__)
+
+TOP_N = 50
+BATCH_SIZE = 128
+DISTANCE_SCALE_KM = 50.0
+AFFINITY_WEIGHT = 0.5
+PROXIMITY_WEIGHT = 0.35
+POPULARITY_WEIGHT = 0.15
+
+POPULAR_KEY = "recommendations:popular"
+ACTION_TYPE_INDEX = {action_type: index for index, (action_type, _) in enumerate(ClimateAction.ACTION_TYPES)}
+
+
+def recommendation_key(user_id):
+    return f"recommendations:user:{user_id}"
+
+
+class LocalRefresher:
+    """Refreshes the rankings inside this process when no other process can share them"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refreshed_at = None
+        self._refreshing = False
+    
+    def refresh_if_due(self):
+        interval = settings.RECOMMENDATION_REFRESH_INTERVAL or settings.RECOMMENDATION_CACHE_TIMEOUT
+        with self._lock:
+            due = not self._refreshing and (
+                self._refreshed_at is None or time.monotonic() - self._refreshed_at >= interval
+            )
+            if due:
+                self._refreshing = True
+        if due:
+            background.submit(self._refresh)
+    
+    def _refresh(self):
+        try:
+            refresh_recommendations()
+        finally:
+            with self._lock:
+                self._refreshed_at, self._refreshing = time.monotonic(), False
+    
+    def reset(self):
+        with self._lock:
+            self._refreshed_at = None
+
+
+local_refresher = LocalRefresher()
+
+
+def recommended_action_ids(user_id):
+    """The cached ranking for ``user_id``, or the popular actions if there is none"""
+    if not cache_is_shared():
+        local_refresher.refresh_if_due()
+    ids = cache.get(recommendation_key(user_id))
+    if ids is None:
+        ids = cache.get(POPULAR_KEY)
+    if ids is None:
+        ids = list(
+            ClimateAction.objects.filter(upcoming_q())
+            .order_by("-participant_count", "start_date")
+            .values_list("pk", flat=True)[:TOP_N]
+        )
+    return ids
+
+
+class ActionMatrix:
+    """Upcoming actions as parallel arrays, indexed by column"""
+    
+    def __init__(self):
+        rows = list(
+            ClimateAction.objects.filter(upcoming_q())
+            .order_by()
+            .values_list("pk", "organizer_id", "action_type", "latitude", "longitude", "participant_count")
+        )
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.organizer_ids = np.array([row[1] for row in rows], dtype=np.int64)
+        self.types = np.array([ACTION_TYPE_INDEX.get(row[2], 0) for row in rows], dtype=np.intp)
+        self.unit = unit_vectors(
+            np.array([row[3] for row in rows], dtype=np.float64), np.array([row[4] for row in rows], dtype=np.float64)
+        ).T.copy()
+        counts = np.array([row[5] for row in rows], dtype=np.float32)
+        self.popularity = np.zeros(len(rows), dtype=np.float32)
+        if len(rows) and counts.max():
+            self.popularity = np.log1p(counts) / np.log1p(counts.max())
+        self.column = {action_id: column for column, action_id in enumerate(self.ids.tolist())}
+    
+    def __len__(self):
+        return len(self.ids)
+
+
+class UserProfiles:
+    """Per-user type affinity, home coordinates and already-taken actions"""
+    
+    def __init__(self, actions):
+        participations = ActionParticipation.objects.exclude(participation_type="cancelled").order_by()
+        organized = ClimateAction.objects.order_by()
+        type_counts = [
+            *participations.values_list("user_id", "action__action_type").annotate(n=Count("id")),
+            *organized.values_list("organizer_id", "action_type").annotate(n=Count("id")),
+        ]
+        location_sums = [
+            *participations.values_list("user_id").annotate(
+                Sum("action__latitude"), Sum("action__longitude"), Count("id")
+            ),
+            *organized.values_list("organizer_id").annotate(Sum("latitude"), Sum("longitude"), Count("id")),
+        ]
+        city_centres = {
+            city: (lat, lng)
+            for city, lat, lng in ClimateAction.objects.exclude(city="").order_by()
+            .values_list(Lower("city")).annotate(Avg("latitude"), Avg("longitude"))
+        }
+        profile_cities = {
+            user_id: location.split(",")[0].strip().lower()
+            for user_id, location in User.objects.filter(is_active=True).exclude(location="").values_list("pk", "location")
+        }
+        
+        user_ids = sorted(
+            {row[0] for row in type_counts}
+            | {user_id for user_id, city in profile_cities.items() if city in city_centres}
+        )
+        self.ids = np.array(user_ids, dtype=np.int64)
+        self.row = {user_id: row for row, user_id in enumerate(user_ids)}
+        
+        self.affinity = np.zeros((len(user_ids), len(ACTION_TYPE_INDEX)), dtype=np.float32)
+        if type_counts:
+            rows = np.array([self.row[user_id] for user_id, _, _ in type_counts], dtype=np.intp)
+            columns = np.array([ACTION_TYPE_INDEX.get(action_type, 0) for _, action_type, _ in type_counts], dtype=np.intp)
+            np.add.at(self.affinity, (rows, columns), np.array([n for _, _, n in type_counts], dtype=np.float32))
+        totals = self.affinity.sum(axis=1, keepdims=True)
+        np.divide(self.affinity, totals, out=self.affinity, where=totals > 0)
+        
+        # Home = mean location of everything the user took part in, else their city
+        sums = np.zeros((len(user_ids), 3))
+        for user_id, lat_sum, lng_sum, count in location_sums:
+            sums[self.row[user_id]] += (lat_sum, lng_sum, count)
+        for user_id, city in profile_cities.items():
+            row = self.row.get(user_id)
+            if row is not None and not sums[row, 2] and city in city_centres:
+                sums[row] = (*city_centres[city], 1)
+        has_home = sums[:, 2] > 0
+        counts = np.maximum(sums[:, 2], 1)
+        self.unit = unit_vectors(sums[:, 0] / counts, sums[:, 1] / counts)
+        self.unit[~has_home] = 0
+        
+        # Upcoming actions each user already joined or organizes, as (row, column) pairs
+        taken = [
+            (self.row[user_id], actions.column[action_id])
+            for user_id, action_id in participations.filter(action__status="upcoming").values_list("user_id", "action_id")
+            if action_id in actions.column
+        ]
+        taken += [
+            (self.row[organizer_id], column)
+            for column, organizer_id in enumerate(actions.organizer_ids.tolist())
+            if organizer_id in self.row
+        ]
+        self.taken = np.array(taken, dtype=np.intp).reshape(-1, 2)
+    
+    def __len__(self):
+        return len(self.ids)
+
+
+def unit_vectors(lat, lng):
+    """Points on the unit sphere for degree coordinates, one row per point"""
+    lat, lng = np.radians(lat), np.radians(lng)
+    return np.stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)], axis=-1).astype(np.float32)
+
+
+def distance_km(user_units, action_units):
+    """Great-circle distances between users (rows) and actions (columns).
+    
+    One matrix product of unit vectors gives every cosine at once. float32
+    resolves distances to about 2 km, well below DISTANCE_SCALE_KM.
+    """
+    return EARTH_RADIUS_KM * np.arccos(np.clip(user_units @ action_units, -1, 1))
+
+
+def score_batch(users, actions, rows):
+    """Scores of every action (columns) for the users at ``rows``"""
+    scores = AFFINITY_WEIGHT * users.affinity[rows][:, actions.types]
+    scores += POPULARITY_WEIGHT * actions.popularity[None, :]
+    
+    # Users without a home have a zero vector, which puts every action a
+    # quarter of the globe away and makes proximity vanish
+    proximity = distance_km(users.unit[rows], actions.unit)
+    proximity *= np.float32(-1 / DISTANCE_SCALE_KM)
+    np.exp(proximity, out=proximity)
+    proximity *= np.float32(PROXIMITY_WEIGHT)
+    scores += proximity
+    
+    in_batch = (users.taken[:, 0] >= rows[0]) & (users.taken[:, 0] <= rows[-1])
+    taken = users.taken[in_batch]
+    scores[taken[:, 0] - rows[0], taken[:, 1]] = -np.inf
+    return scores
+
+
+def top_n(scores, n):
+    """Column indices of the ``n`` best scores in each row, best first"""
+    n = min(n, scores.shape[1])
+    best = np.argpartition(scores, scores.shape[1] - n, axis=1)[:, -n:]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def refresh_recommendations(batch_size=BATCH_SIZE):
+    """Recompute and cache every user's top-N upcoming actions; returns the number of users"""
+    timeout = settings.RECOMMENDATION_CACHE_TIMEOUT
+    actions = ActionMatrix()
+    popular = actions.ids[np.argsort(-actions.popularity, kind="stable")[:TOP_N]].tolist()
+    cache.set(POPULAR_KEY, popular, timeout)
+    if not len(actions):
+        return 0
+    
+    users = UserProfiles(actions)
+    for start in range(0, len(users), batch_size):
+        rows = np.arange(start, min(start + batch_size, len(users)))
+        columns, scores = top_n(score_batch(users, actions, rows), TOP_N)
+        cache.set_many(
+            {
+                recommendation_key(user_id): actions.ids[user_columns[np.isfinite(user_scores)]].tolist()
+                for user_id, user_columns, user_scores in zip(users.ids[rows].tolist(), columns, scores)
+            },
+            timeout,
+        )
+    return len(users)
+
+
+def refresh_shared_recommendations():
+    """``refresh_recommendations`` as a periodic task for the web processes to read"""
+    if not cache_is_shared():
+        logger.warning(
+            "The cache is process-local, so web processes will not see these recommendations; "
+            "they refresh their own instead."
+        )
+    return refresh_recommendations()
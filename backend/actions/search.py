@@ -0,0 +1,194 @@
+"""Full-text search over climate actions.
+
+SQLite keeps an FTS5 index (``actions_climateaction_fts``) in sync with
+triggers, so bulk inserts and ``update()`` calls are indexed as well. The
+update trigger only fires for the searched columns, so counter and status
+updates do not re-tokenize the document.
+PostgreSQL uses a GIN index over the same ``tsvector`` expression that the
+queries build. Both backends annotate results with ``search_rank`` (higher is
+better) and a highlighted ``search_snippet``.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import F, FloatField, Func, Q, TextField, Value
+
+SEARCH_FIELDS = ("title", "description", "organization_name", "tags")
+# Relative weight of each field in the ranking, in SEARCH_FIELDS order
+FIELD_WEIGHTS = (10.0, 1.0, 4.0, 6.0)
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+
+FTS_TABLE = "actions_climateaction_fts"
+SOURCE_TABLE = "actions_climateaction"
+TRIGGER_SQL = {
+    f"{FTS_TABLE}_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {SOURCE_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, {", ".join(SEARCH_FIELDS)})
+            VALUES (new.id, {", ".join(f"new.{field}" for field in SEARCH_FIELDS)});
+        END
+    """,
+    f"{FTS_TABLE}_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {SOURCE_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {", ".join(SEARCH_FIELDS)})
+            VALUES ('delete', old.id, {", ".join(f"old.{field}" for field in SEARCH_FIELDS)});
+        END
+    """,
+    f"{FTS_TABLE}_au": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {", ".join(SEARCH_FIELDS)} ON {SOURCE_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {", ".join(SEARCH_FIELDS)})
+            VALUES ('delete', old.id, {", ".join(f"old.{field}" for field in SEARCH_FIELDS)});
+            INSERT INTO {FTS_TABLE}(rowid, {", ".join(SEARCH_FIELDS)})
+            VALUES (new.id, {", ".join(f"new.{field}" for field in SEARCH_FIELDS)});
+        END
+    """,
+}
+POSTGRES_INDEX = "action_search_gin_idx"
+
+
+def search_actions(queryset, query):
+    """Filter ``queryset`` to actions matching ``query``, best matches first"""
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        return _search_postgres(queryset, query)
+    if vendor == "sqlite":
+        return _search_sqlite(queryset, query)
+    # No index available; fall back to substring matching without ranking
+    condition = Q()
+    for term in _terms(query):
+        condition &= Q(*[(f"{field}__icontains", term) for field in SEARCH_FIELDS], _connector=Q.OR)
+    return queryset.filter(condition).annotate(search_rank=Value(0.0), search_snippet=Value(""))
+
+
+def _terms(query):
+    return re.findall(r"\w+", query)
+
+
+def _fts5_expression(query):
+    # Quote every term so user input can never be parsed as FTS5 syntax, and
+    # let the last one match as a prefix for search-as-you-type
+    terms = [f'"{term}"' for term in _terms(query)]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _search_sqlite(queryset, query):
+    expression = _fts5_expression(query)
+    if not expression:
+        return queryset.none()
+    document = F("search_entry__document")
+    return (
+        queryset.filter(search_entry__document__match=expression)
+        .annotate(
+            # bm25() is lower for better matches
+            search_rank=-Func(document, *map(Value, FIELD_WEIGHTS), function="bm25", output_field=FloatField()),
+            search_snippet=Func(
+                document,
+                Value(-1),
+                Value(HIGHLIGHT_START),
+                Value(HIGHLIGHT_STOP),
+                Value("…"),
+                Value(16),
+                function="snippet",
+                output_field=TextField(),
+            ),
+        )
+        .order_by("-search_rank", "start_date")
+    )
+
+
+def search_vector():
+    """The weighted document vector shared by the GIN index and the queries"""
+    from django.contrib.postgres.search import SearchVector
+    
+    weights = ("A", "D", "C", "B")
+    vector = None
+    for field, weight in zip(SEARCH_FIELDS, weights):
+        part = SearchVector(field, weight=weight, config="simple")
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def _search_postgres(queryset, query):
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+    
+    terms = _terms(query)
+    if not terms:
+        return queryset.none()
+    search_query = SearchQuery(" & ".join(f"{term}:*" for term in terms), search_type="raw", config="simple")
+    return (
+        queryset.annotate(search_document=search_vector())
+        .filter(search_document=search_query)
+        .annotate(
+            search_rank=SearchRank(F("search_document"), search_query),
+            search_snippet=SearchHeadline(
+                "description",
+                search_query,
+                config="simple",
+                start_sel=HIGHLIGHT_START,
+                stop_sel=HIGHLIGHT_STOP,
+                max_words=30,
+            ),
+        )
+        .order_by("-search_rank", "start_date")
+    )
+
+
+def install_search_index(schema_editor, model):
+    """Create the full-text index for ``model`` if it is missing.
+    
+    Safe to call repeatedly. On SQLite, rebuilding a table during a later
+    migration drops its triggers, so missing triggers are recreated and the
+    index rebuilt from the source table. Triggers whose definition changed
+    since they were created are replaced.
+    """
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [SOURCE_TABLE]
+            )
+            existing = dict(cursor.fetchall())
+        outdated = [
+            name for name, sql in TRIGGER_SQL.items()
+            if name in existing and _normalized_sql(existing[name]) != _normalized_sql(sql)
+        ]
+        missing = set(TRIGGER_SQL) - set(existing)
+        if not outdated and not missing:
+            return
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{', '.join(SEARCH_FIELDS)}, content='{SOURCE_TABLE}', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        for name in outdated:
+            schema_editor.execute(f"DROP TRIGGER {name}")
+        for sql in TRIGGER_SQL.values():
+            schema_editor.execute(sql)
+        if missing:
+            schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    elif connection.vendor == "postgresql":
+        from django.contrib.postgres.indexes import GinIndex
+        
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", [POSTGRES_INDEX])
+            if cursor.fetchone():
+                return
+        schema_editor.add_index(model, GinIndex(search_vector(), name=POSTGRES_INDEX))
+
+
+def _normalized_sql(sql):
+    # sqlite_master keeps the statement without IF NOT EXISTS
+    return " ".join(sql.replace("IF NOT EXISTS ", "").split())
+
+
+def uninstall_search_index(schema_editor, model):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        for trigger in TRIGGER_SQL:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {POSTGRES_INDEX}")
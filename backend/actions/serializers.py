@@ -1,6 +1,10 @@
+from django.conf import settings
+from django.db.models import Count, Q
+from django.urls import reverse
 from rest_framework import serializers
 from .models import ClimateAction, ActionParticipation, ActionResource, ActionUpdate
 from accounts.serializers import UserProfileSerializer
+from baltic_climate.images import derivative_urls
 
 
 class ClimateActionSerializer(serializers.ModelSerializer):
@@ -8,17 +12,27 @@ class ClimateActionSerializer(serializers.ModelSerializer):
     participant_count = serializers.ReadOnlyField()
     action_type_display = serializers.CharField(source="get_action_type_display", read_only=True)
     status_display = serializers.CharField(source="get_status_display", read_only=True)
+    # Only present when listing with ?near= or ?q=
+    distance_km = serializers.FloatField(read_only=True)
+    search_rank = serializers.FloatField(read_only=True)
+    search_snippet = serializers.CharField(read_only=True)
+    # Only present in the current user's action list
+    role = serializers.CharField(read_only=True)
+    image_urls = serializers.SerializerMethodField()
     
     class Meta:
         model = ClimateAction
-        fields = "__all__"
+        exclude = ("normalized_tags", "image_derivatives")
         read_only_fields = ("organizer", "created_at", "updated_at", "impact_score")
+    
+    def get_image_urls(self, obj):
+        return derivative_urls(obj.image_derivatives, self.context.get("request"))
 
 
 class ClimateActionCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ClimateAction
-        fields = "__all__"
+        exclude = ("normalized_tags", "image_derivatives")
         read_only_fields = ("organizer", "created_at", "updated_at", "impact_score")
     
     def create(self, validated_data):
@@ -52,18 +66,61 @@ class ActionUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ActionUpdate
         fields = "__all__"
-        read_only_fields = ("created_by", "created_at")
+        read_only_fields = ("action", "created_by", "created_at")
 
 
 class ActionDetailSerializer(serializers.ModelSerializer):
     organizer = UserProfileSerializer(read_only=True)
-    participants = ActionParticipationSerializer(many=True, read_only=True)
-    resources = ActionResourceSerializer(many=True, read_only=True)
-    updates = ActionUpdateSerializer(many=True, read_only=True)
+    participants = serializers.SerializerMethodField()
+    resources = serializers.SerializerMethodField()
+    updates = serializers.SerializerMethodField()
+    participant_summary = serializers.SerializerMethodField()
+    image_urls = serializers.SerializerMethodField()
     participant_count = serializers.ReadOnlyField()
     action_type_display = serializers.CharField(source="get_action_type_display", read_only=True)
     status_display = serializers.CharField(source="get_status_display", read_only=True)
     
     class Meta:
         model = ClimateAction
-        fields = "__all__"
+        exclude = ("normalized_tags", "image_derivatives")
+    
+    def get_participants(self, obj):
+        return self._preview(obj, "participants", ActionParticipationSerializer, "action_participants")
+    
+    def get_resources(self, obj):
+        return self._preview(obj, "resources", ActionResourceSerializer, "action_resources")
+    
+    def get_updates(self, obj):
+        return self._preview(obj, "updates", ActionUpdateSerializer, "action_updates")
+    
+    def get_image_urls(self, obj):
+        return derivative_urls(obj.image_derivatives, self.context.get("request"))
+    
+    def get_participant_summary(self, obj):
+        return obj.participants.aggregate(**{
+            participation_type: Count("id", filter=Q(participation_type=participation_type))
+            for participation_type, _ in ActionParticipation.PARTICIPATION_TYPES
+        })
+    
+    def _preview(self, obj, relation, serializer_class, url_name):
+        """First page of a nested collection plus a link to the rest of it.
+        
+        The detail view prefetches one item past the limit into
+        ``<relation>_preview`` so we can tell whether a next page exists.
+        """
+        limit = settings.ACTION_DETAIL_PREVIEW_LIMIT
+        items = getattr(obj, f"{relation}_preview", None)
+        if items is None:
+            items = list(getattr(obj, relation).all()[:limit + 1])
+        
+        next_url = None
+        if len(items) > limit:
+            next_url = f"{reverse(url_name, kwargs={'pk': obj.pk})}?page=2"
+            request = self.context.get("request")
+            if request is not None:
+                next_url = request.build_absolute_uri(next_url)
+        
+        return {
+            "results": serializer_class(items[:limit], many=True, context=self.context).data,
+            "next": next_url,
+        }
@@ -0,0 +1,209 @@
+import threading
+
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db import connections
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from accounts.achievements import JOINED, ORGANIZED, queue_achievement_check
+from accounts.activity import record_activity, unrecord_activity
+from accounts.leaderboard import record_points
+from baltic_climate.images import image_saved
+from accounts.models import User
+
+from .cache import bump_data_version
+from .live import publish, publish_action_event
+from .models import ClimateAction, ActionParticipation, ActionUpdate
+from .notifications import queue_update_notifications
+from .search import FTS_TABLE, install_search_index
+from .tags import sync_action_tags
+
+# Countries of the actions this thread is deleting, so the participations
+# deleted with them need no query each to find where their points went
+_deleting = threading.local()
+
+
+@receiver(post_save, sender=ClimateAction)
+@receiver(post_delete, sender=ClimateAction)
+@receiver(post_save, sender=ActionParticipation)
+@receiver(post_delete, sender=ActionParticipation)
+@receiver(m2m_changed, sender=ClimateAction.normalized_tags.through)
+def invalidate_action_caches(sender, **kwargs):
+    bump_data_version()
+
+
+@receiver(post_save, sender=ClimateAction)
+def refresh_image_derivatives(sender, instance, raw=False, **kwargs):
+    if not raw:
+        image_saved(instance)
+
+
+@receiver(post_save, sender=ClimateAction)
+def index_action_tags(sender, instance, created, raw=False, **kwargs):
+    if raw or (created and not instance.tags):
+        return
+    sync_action_tags(instance)
+
+
+@receiver(post_save, sender=ActionParticipation)
+def count_new_participant(sender, instance, created, raw=False, **kwargs):
+    # Registrations through the join endpoint already took their seat in
+    # ClimateAction.reserve_seat()
+    if created and not raw and not getattr(instance, "seat_reserved", False):
+        ClimateAction.objects.filter(pk=instance.action_id).update(participant_count=F("participant_count") + 1)
+
+
+@receiver(post_delete, sender=ActionParticipation)
+def count_removed_participant(sender, instance, **kwargs):
+    ClimateAction.objects.filter(pk=instance.action_id).update(
+        participant_count=Greatest(F("participant_count") - 1, Value(0))
+    )
+
+
+def _adjust_user_stats(user_id, counter, delta, points, country, when):
+    User.objects.filter(pk=user_id).update(**{
+        counter: Greatest(F(counter) + delta, Value(0)),
+        "impact_score": Greatest(F("impact_score") + delta * points, Value(0)),
+    })
+    record_points(user_id, delta * points, country, when)
+
+
+def _participation_country(participation):
+    if ActionParticipation.action.is_cached(participation):
+        return participation.action.country
+    deleting = getattr(_deleting, "countries", {})
+    if participation.action_id in deleting:
+        return deleting[participation.action_id]
+    return ClimateAction.objects.filter(pk=participation.action_id).values_list("country", flat=True).first()
+
+
+@receiver(post_save, sender=ActionParticipation)
+def count_joined_action(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _adjust_user_stats(
+            instance.user_id, "actions_joined", 1, User.JOINED_ACTION_POINTS,
+            _participation_country(instance), instance.registered_at,
+        )
+
+
+@receiver(post_delete, sender=ActionParticipation)
+def uncount_joined_action(sender, instance, **kwargs):
+    _adjust_user_stats(
+        instance.user_id, "actions_joined", -1, User.JOINED_ACTION_POINTS,
+        _participation_country(instance), instance.registered_at,
+    )
+
+
+@receiver(pre_delete, sender=ClimateAction)
+def remember_deleted_country(sender, instance, **kwargs):
+    if not hasattr(_deleting, "countries"):
+        _deleting.countries = {}
+    _deleting.countries[instance.pk] = instance.country
+
+
+@receiver(post_save, sender=ClimateAction)
+def count_organized_action(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _adjust_user_stats(
+            instance.organizer_id, "actions_organized", 1, User.ORGANIZED_ACTION_POINTS,
+            instance.country, instance.created_at,
+        )
+
+
+@receiver(post_delete, sender=ClimateAction)
+def uncount_organized_action(sender, instance, **kwargs):
+    getattr(_deleting, "countries", {}).pop(instance.pk, None)
+    _adjust_user_stats(
+        instance.organizer_id, "actions_organized", -1, User.ORGANIZED_ACTION_POINTS,
+        instance.country, instance.created_at,
+    )
+
+
+@receiver(post_save, sender=ActionParticipation)
+def check_participation_achievements(sender, instance, created, raw=False, **kwargs):
+    # The organizer's reach grows with every participant too
+    if created and not raw:
+        queue_achievement_check({instance.user_id, instance.action.organizer_id}, JOINED)
+
+
+@receiver(post_save, sender=ClimateAction)
+def check_organizer_achievements(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        queue_achievement_check([instance.organizer_id], ORGANIZED)
+
+
+@receiver(pre_save, sender=ActionParticipation)
+def remember_participation_type(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance.previous_participation_type = (
+            ActionParticipation.objects.filter(pk=instance.pk).values_list("participation_type", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=ActionParticipation)
+def record_participation_activity(sender, instance, created, raw=False, **kwargs):
+    # Joining and completing an action each count towards the contribution graph
+    if raw:
+        return
+    completed = (
+        instance.participation_type == "completed"
+        and getattr(instance, "previous_participation_type", None) != "completed"
+    )
+    if created or completed:
+        record_activity(instance.user_id)
+
+
+@receiver(post_delete, sender=ActionParticipation)
+def remove_participation_activity(sender, instance, **kwargs):
+    # Leaving takes back the day the user joined; a completion stays counted
+    unrecord_activity(instance.user_id, timezone.localdate(instance.registered_at))
+
+
+@receiver(post_save, sender=ActionUpdate)
+def notify_participants(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        queue_update_notifications(instance)
+
+
+@receiver(post_save, sender=ActionParticipation)
+@receiver(post_delete, sender=ActionParticipation)
+def push_participant_count(sender, instance, created=True, raw=False, **kwargs):
+    if created and not raw:
+        publish_action_event(instance.action_id, "participants")
+
+
+@receiver(post_save, sender=ActionUpdate)
+def push_action_update(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        publish_action_event(instance.action_id, "update", update={
+            "id": instance.pk,
+            "title": instance.title,
+            "is_important": instance.is_important,
+            "created_at": instance.created_at.isoformat(),
+        })
+
+
+@receiver(post_save, sender=ClimateAction)
+def push_action_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        publish_action_event(instance.pk, "action")
+
+
+@receiver(post_delete, sender=ClimateAction)
+def push_action_deleted(sender, instance, **kwargs):
+    publish({
+        "type": "deleted",
+        "action": instance.pk,
+        "latitude": instance.latitude,
+        "longitude": instance.longitude,
+    })
+
+
+def ensure_search_index(sender, using, **kwargs):
+    # Later migrations that rebuild the actions table drop its SQLite triggers
+    connection = connections[using]
+    if connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names():
+        with connection.schema_editor() as schema_editor:
+            install_search_index(schema_editor, ClimateAction)
@@ -0,0 +1,96 @@
+"""Keep ``ClimateAction.status`` in line with each action's dates.
+
+The stored status lags behind the dates until ``refresh_action_statuses``
+runs again, so readers that filter or count by status go by the dates
+(``status_q``, ``current_status``, ``upcoming_q``) and only trust the
+stored value for cancellations.
+
+``refresh_action_statuses`` publishes a live "status" event per moved
+action through ``LIVE_UPDATES_BROKER``. With the default
+``InProcessBroker`` those only reach clients of the process that runs it,
+which for ``manage.py run_periodic_tasks`` or ``refresh_action_statuses``
+is none. Web clients then see the new status on their next read; pushing
+it to them needs a broker shared between processes.
+"""
+
+import operator
+from functools import reduce
+
+from django.db.models import Case, CharField, Q, Value, When
+from django.utils import timezone
+
+from .cache import bump_data_version
+from .live import publish
+from .models import ClimateAction
+
+SCHEDULED_STATUSES = ("upcoming", "ongoing", "completed")
+
+
+def status_conditions(now):
+    """The date condition under which an action should have each status"""
+    return {
+        "upcoming": Q(start_date__gt=now),
+        "ongoing": Q(start_date__lte=now, end_date__gte=now),
+        "completed": Q(end_date__lt=now),
+    }
+
+
+def status_q(statuses, now=None):
+    """Actions whose status at ``now`` is one of ``statuses``, judged by their dates"""
+    conditions = status_conditions(now or timezone.now())
+    matches = [conditions[status] & ~Q(status="cancelled") for status in statuses if status in conditions]
+    if "cancelled" in statuses:
+        matches.append(Q(status="cancelled"))
+    return reduce(operator.or_, matches, Q(pk__in=[]))
+
+
+def current_status(now=None):
+    """Each action's status at ``now`` as an expression, for grouping by it"""
+    conditions = status_conditions(now or timezone.now())
+    return Case(
+        When(status="cancelled", then=Value("cancelled")),
+        *(When(condition, then=Value(status)) for status, condition in conditions.items()),
+        output_field=CharField(),
+    )
+
+
+def upcoming_q(now=None):
+    """Actions that have not started yet.
+    
+    The date check keeps readers right while the stored status lags behind,
+    e.g. between runs of ``refresh_action_statuses``.
+    """
+    return Q(status="upcoming", start_date__gt=now or timezone.now())
+
+
+def not_ended_q(now=None):
+    """Upcoming and ongoing actions that have not ended yet"""
+    return Q(status__in=("upcoming", "ongoing"), end_date__gte=now or timezone.now())
+
+
+def refresh_action_statuses(now=None):
+    """Move actions between upcoming, ongoing and completed.
+    
+    Runs one set-based UPDATE per target status over the indexed date
+    columns and leaves cancelled actions alone. The moving rows are read
+    once beforehand so live subscribers hear about each change. Returns
+    the number of rows moved into each status.
+    """
+    now = now or timezone.now()
+    stale = {}
+    for status, condition in status_conditions(now).items():
+        stale[status] = condition & Q(status__in=[other for other in SCHEDULED_STATUSES if other != status])
+    
+    changes = (
+        ClimateAction.objects.filter(reduce(operator.or_, stale.values()))
+        .annotate(new_status=Case(*(When(condition, then=Value(status)) for status, condition in stale.items())))
+        .order_by()
+        .values("pk", "new_status", "latitude", "longitude", "participant_count")
+    )
+    for change in changes:
+        publish({"type": "status", "action": change.pop("pk"), "status": change.pop("new_status"), **change})
+    
+    moved = {status: ClimateAction.objects.filter(condition).update(status=status) for status, condition in stale.items()}
+    if any(moved.values()):
+        bump_data_version()
+    return moved
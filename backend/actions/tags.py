@@ -0,0 +1,60 @@
+"""Normalized tag index for the comma-separated ``ClimateAction.tags`` field."""
+
+from django.db.models import Count
+
+from .models import ActionTag, ClimateAction
+
+MAX_TAG_LENGTH = ActionTag._meta.get_field("name").max_length
+
+
+def normalize_tag(tag):
+    return " ".join(tag.split()).lower()[:MAX_TAG_LENGTH]
+
+
+def parse_tags(tags):
+    """Unique normalized tags from a comma-separated string, in input order"""
+    names = (normalize_tag(tag) for tag in tags.split(","))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def get_or_create_tags(names):
+    """Map each tag name to its ActionTag, creating missing ones in bulk"""
+    ActionTag.objects.bulk_create([ActionTag(name=name) for name in names], ignore_conflicts=True)
+    return {tag.name: tag for tag in ActionTag.objects.filter(name__in=names)}
+
+
+def sync_action_tags(action):
+    names = parse_tags(action.tags)
+    current = set(action.normalized_tags.values_list("name", flat=True))
+    if current == set(names):
+        return
+    tags = get_or_create_tags(names) if names else {}
+    action.normalized_tags.set(tags.values())
+
+
+def sync_tags_bulk(actions):
+    """Index tags for many newly created actions with a constant number of queries"""
+    names_by_action = {action.pk: parse_tags(action.tags) for action in actions}
+    all_names = {name for names in names_by_action.values() for name in names}
+    if not all_names:
+        return
+    tags = get_or_create_tags(all_names)
+    Through = ClimateAction.normalized_tags.through
+    Through.objects.bulk_create(
+        [
+            Through(climateaction_id=action_id, actiontag_id=tags[name].pk)
+            for action_id, names in names_by_action.items()
+            for name in names
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def tag_counts(limit):
+    """Most used tags with the number of actions carrying each"""
+    return list(
+        ActionTag.objects.annotate(action_count=Count("actions"))
+        .filter(action_count__gt=0)
+        .order_by("-action_count", "name")
+        .values("name", "action_count")[:limit]
+    )
@@ -1,3 +1,1036 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from .models import ClimateAction, ActionParticipation, ActionUpdate, ActionUpdateDelivery
+from .bulk import import_actions
+from .live import Subscription, event_stream, get_broker
+from .notifications import CLAIM_TIMEOUT, claim_deliveries, send_update_notifications
+from .recommendations import (
+    local_refresher, recommendation_key, refresh_recommendations, refresh_shared_recommendations,
+)
+from .search import FTS_TABLE, install_search_index
+from .status import refresh_action_statuses
+
+
+def make_user(name):
+    return User.objects.create_user(
+        username=name,
+        email=f"{name}@example.com",
+        first_name=name.title(),
+        last_name="Tester",
+    )
+
+
+def make_action(organizer, **overrides):
+    start = timezone.now() + timedelta(days=7)
+    fields = {
+        "title": "Beach clean-up",
+        "description": "Collect litter along the shore.",
+        "action_type": "ngo_initiative",
+        "location_name": "Brzeźno beach",
+        "latitude": 54.41,
+        "longitude": 18.62,
+        "country": "Poland",
+        "city": "Gdańsk",
+        "start_date": start,
+        "end_date": start + timedelta(hours=3),
+        "organizer": organizer,
+    }
+    fields.update(overrides)
+    return ClimateAction.objects.create(**fields)
+
+
+def dates_for(status):
+    """Start and end dates that put an action in ``status``"""
+    now = timezone.now()
+    start = {
+        "upcoming": now + timedelta(days=7),
+        "ongoing": now - timedelta(days=1),
+        "completed": now - timedelta(days=10),
+    }[status]
+    return {"start_date": start, "end_date": start + timedelta(days=2)}
+
+
+class MapActionsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.viewer = make_user("viewer")
+        self.client.force_authenticate(self.viewer)
+
+    def _populate(self, count, offset=0):
+        for i in range(offset, offset + count):
+            organizer = make_user(f"organizer{i}")
+            action = make_action(organizer, title=f"Action {i}")
+            ActionParticipation.objects.create(user=self.viewer, action=action)
+
+    def test_query_count_is_independent_of_action_count(self):
+        self._populate(3)
+        with self.assertNumQueries(1):
+            small = self.client.get(reverse("map_actions"))
+        cache.clear()
+        self._populate(10, offset=3)
+        with self.assertNumQueries(1):
+            large = self.client.get(reverse("map_actions"))
+        self.assertEqual(len(small.data), 3)
+        self.assertEqual(len(large.data), 13)
+        self.assertTrue(all(item["participant_count"] == 1 for item in large.data))
+
+    def test_cached_response_is_served_without_queries(self):
+        self._populate(2)
+        self.client.get(reverse("map_actions"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("map_actions"))
+        self.assertEqual(len(response.data), 2)
+
+    def test_cache_is_invalidated_by_writes(self):
+        self._populate(1)
+        action = ClimateAction.objects.get()
+        self.client.get(reverse("map_actions"))
+
+        ActionParticipation.objects.create(user=make_user("late"), action=action)
+        response = self.client.get(reverse("map_actions"))
+        self.assertEqual(response.data[0]["participant_count"], 2)
+
+        action.status = "cancelled"
+        action.save()
+        response = self.client.get(reverse("map_actions"))
+        self.assertEqual(response.data, [])
+
+
+class ActionStatusTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.organizer = make_user("organizer")
+
+    def test_status_follows_dates_on_save(self):
+        self.assertEqual(make_action(self.organizer, **dates_for("ongoing")).status, "ongoing")
+        self.assertEqual(make_action(self.organizer, status="ongoing", **dates_for("upcoming")).status, "upcoming")
+        self.assertEqual(make_action(self.organizer, status="cancelled", **dates_for("ongoing")).status, "cancelled")
+
+    def test_refresh_moves_stale_statuses_in_bulk(self):
+        upcoming = make_action(self.organizer, **dates_for("upcoming"))
+        ongoing = make_action(self.organizer, **dates_for("ongoing"))
+        cancelled = make_action(self.organizer, status="cancelled", **dates_for("upcoming"))
+
+        later = timezone.now() + timedelta(days=8)
+        with self.assertNumQueries(4):
+            moved = refresh_action_statuses(now=later)
+        self.assertEqual(moved, {"upcoming": 0, "ongoing": 1, "completed": 1})
+        for action, status in [(upcoming, "ongoing"), (ongoing, "completed"), (cancelled, "cancelled")]:
+            action.refresh_from_db()
+            self.assertEqual(action.status, status)
+
+    def test_refresh_invalidates_the_map(self):
+        client = APIClient()
+        client.force_authenticate(self.organizer)
+        make_action(self.organizer, **dates_for("ongoing"))
+        self.assertEqual(len(client.get(reverse("map_actions")).data), 1)
+
+        refresh_action_statuses(now=timezone.now() + timedelta(days=5))
+        self.assertEqual(client.get(reverse("map_actions")).data, [])
+
+    def test_periodic_runner_runs_enabled_tasks(self):
+        started = make_action(self.organizer, **dates_for("upcoming"))
+        ClimateAction.objects.filter(pk=started.pk).update(**dates_for("ongoing"))
+
+        out = StringIO()
+        call_command("run_periodic_tasks", "--once", stdout=out)
+        self.assertIn("No periodic tasks are enabled", out.getvalue())
+
+        with override_settings(ACTION_STATUS_REFRESH_INTERVAL=60):
+            call_command("run_periodic_tasks", "--once", stdout=out)
+        self.assertIn("Ran refresh_action_statuses", out.getvalue())
+        self.assertNotIn("refresh_recommendations", out.getvalue())
+        started.refresh_from_db()
+        self.assertEqual(started.status, "ongoing")
+
+    def test_readers_do_not_wait_for_the_refresher(self):
+        client = APIClient()
+        client.force_authenticate(self.organizer)
+        started = make_action(self.organizer, title="Started", **dates_for("upcoming"))
+        ended = make_action(self.organizer, title="Ended", **dates_for("ongoing"))
+        make_action(self.organizer, title="Still upcoming", **dates_for("upcoming"))
+        # Dates moved on but the stored statuses have not been refreshed yet
+        ClimateAction.objects.filter(pk=started.pk).update(**dates_for("ongoing"))
+        ClimateAction.objects.filter(pk=ended.pk).update(**dates_for("completed"))
+
+        listed = client.get(reverse("climate_actions"), {"upcoming": "true"}).data["results"]
+        self.assertEqual([item["title"] for item in listed], ["Still upcoming"])
+        self.assertEqual(
+            sorted(item["title"] for item in client.get(reverse("map_actions")).data), ["Started", "Still upcoming"]
+        )
+
+        def titles(**params):
+            return sorted(item["title"] for item in client.get(reverse("climate_actions"), params).data["results"])
+
+        self.assertEqual(titles(status="upcoming"), ["Still upcoming"])
+        self.assertEqual(titles(status="ongoing"), ["Started"])
+        self.assertEqual(titles(status="completed"), ["Ended"])
+        facets = client.get(reverse("action_facets")).data["status"]
+        self.assertEqual(
+            {item["value"]: item["count"] for item in facets}, {"upcoming": 1, "ongoing": 1, "completed": 1}
+        )
+
+
+class ActionListQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.viewer = make_user("viewer")
+        self.client.force_authenticate(self.viewer)
+        for i in range(25):
+            action = make_action(make_user(f"organizer{i}"), title=f"Action {i}")
+            ActionParticipation.objects.create(user=self.viewer, action=action)
+            ActionParticipation.objects.create(user=make_user(f"participant{i}"), action=action)
+
+    def test_list_page_uses_constant_queries(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("climate_actions"))
+        self.assertEqual(len(response.data["results"]), 20)
+        self.assertTrue(all(item["participant_count"] == 2 for item in response.data["results"]))
+        self.assertEqual(response.data["results"][0]["organizer_name"], "Organizer0 Tester")
+
+    def test_user_actions_are_one_deduplicated_page(self):
+        later = timezone.now() + timedelta(days=30)
+        make_action(self.viewer, title="Own action", start_date=later, end_date=later + timedelta(hours=2))
+        both = make_action(self.viewer, title="Own and joined")
+        ActionParticipation.objects.create(user=self.viewer, action=both)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("user_actions"))
+        results = response.data["results"]
+        self.assertEqual(len(results), 20)
+        self.assertEqual(results[0]["role"], "organizer")
+        self.assertEqual([item["role"] for item in results].count("both"), 1)
+        self.assertTrue(all(item["participant_count"] for item in results[1:]))
+
+        second = self.client.get(response.data["next"])
+        self.assertIsNone(second.data["next"])
+        titles = [item["title"] for item in results + second.data["results"]]
+        self.assertEqual(len(titles), 27)
+        self.assertEqual(len(set(titles)), 27)
+
+    def test_user_actions_filter_by_role(self):
+        make_action(self.viewer, title="Own action")
+        both = make_action(self.viewer, title="Own and joined")
+        ActionParticipation.objects.create(user=self.viewer, action=both)
+
+        def titles(role):
+            response = self.client.get(reverse("user_actions"), {"role": role})
+            results = response.data["results"]
+            while response.data["next"]:
+                response = self.client.get(response.data["next"])
+                results += response.data["results"]
+            return sorted(item["title"] for item in results)
+
+        self.assertEqual(titles("organizer"), ["Own action", "Own and joined"])
+        self.assertEqual(titles("both"), ["Own and joined"])
+        self.assertEqual(titles("participant"), sorted([f"Action {i}" for i in range(25)] + ["Own and joined"]))
+        self.assertEqual(self.client.get(reverse("user_actions"), {"role": "host"}).status_code, 400)
+
+
+class ActionDetailTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.viewer = make_user("viewer")
+        self.client.force_authenticate(self.viewer)
+        self.action = make_action(make_user("organizer"))
+        for i in range(25):
+            ActionParticipation.objects.create(
+                user=make_user(f"participant{i}"),
+                action=self.action,
+                participation_type="attended" if i % 5 == 0 else "registered",
+            )
+        for i in range(3):
+            ActionUpdate.objects.create(
+                action=self.action, title=f"Update {i}", content="News", created_by=self.action.organizer
+            )
+
+    def test_nested_collections_are_bounded(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("climate_action_detail", args=[self.action.pk]))
+        participants = response.data["participants"]
+        self.assertEqual(len(participants["results"]), settings.ACTION_DETAIL_PREVIEW_LIMIT)
+        self.assertTrue(participants["next"].endswith(f"/api/actions/{self.action.pk}/participants/?page=2"))
+        self.assertEqual(len(response.data["updates"]["results"]), 3)
+        self.assertIsNone(response.data["updates"]["next"])
+        self.assertEqual(response.data["resources"], {"results": [], "next": None})
+        self.assertEqual(response.data["participant_count"], 25)
+        self.assertEqual(
+            response.data["participant_summary"],
+            {"registered": 20, "attended": 5, "completed": 0, "cancelled": 0},
+        )
+
+    def test_next_link_continues_the_preview(self):
+        response = self.client.get(reverse("climate_action_detail", args=[self.action.pk]))
+        next_page = self.client.get(response.data["participants"]["next"])
+        self.assertEqual(next_page.data["count"], 25)
+        preview_ids = {item["id"] for item in response.data["participants"]["results"]}
+        page_ids = {item["id"] for item in next_page.data["results"]}
+        self.assertFalse(preview_ids & page_ids)
+
+
+class JoinActionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user("joiner")
+        self.client.force_authenticate(self.user)
+        self.action = make_action(make_user("organizer"), max_participants=2)
+
+    def join(self):
+        return self.client.post(reverse("join_action", args=[self.action.pk]))
+
+    def test_join_maintains_participant_count(self):
+        self.assertEqual(self.join().status_code, 201)
+        self.action.refresh_from_db()
+        self.assertEqual(self.action.participant_count, 1)
+
+        self.client.delete(reverse("cancel_participation", args=[self.action.pk]))
+        self.action.refresh_from_db()
+        self.assertEqual(self.action.participant_count, 0)
+
+    def test_duplicate_registration_releases_the_seat(self):
+        self.join()
+        response = self.join()
+        self.assertEqual(response.data, {"error": "Already registered for this action"})
+        self.action.refresh_from_db()
+        self.assertEqual(self.action.participant_count, 1)
+
+    def test_saving_a_stale_instance_keeps_the_count(self):
+        stale = ClimateAction.objects.get(pk=self.action.pk)
+        self.assertEqual(self.join().status_code, 201)
+        ActionParticipation.objects.create(user=make_user("second"), action=self.action)
+
+        stale.title = "Renamed"
+        stale.save()
+        self.action.refresh_from_db()
+        self.assertEqual((self.action.title, self.action.participant_count), ("Renamed", 2))
+        self.client.force_authenticate(make_user("third"))
+        self.assertEqual(self.join().data, {"error": "Action is full"})
+
+    def test_full_action_rejects_registration(self):
+        ActionParticipation.objects.create(user=make_user("first"), action=self.action)
+        ActionParticipation.objects.create(user=make_user("second"), action=self.action)
+        response = self.join()
+        self.assertEqual(response.data, {"error": "Action is full"})
+        self.assertFalse(ActionParticipation.objects.filter(user=self.user).exists())
+
+
+class ConcurrentJoinTests(TransactionTestCase):
+    """Registration burst against a capacity-limited action from many threads"""
+
+    CAPACITY = 50
+    REGISTRATIONS = 300
+    THREADS = 16
+
+    def setUp(self):
+        self.action = make_action(make_user("organizer"), max_participants=self.CAPACITY)
+        self.users = [make_user(f"burst{i}") for i in range(self.REGISTRATIONS)]
+
+    def _register(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        try:
+            return client.post(reverse("join_action", args=[self.action.pk])).status_code
+        finally:
+            connection.close()
+
+    def test_burst_never_oversubscribes(self):
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            statuses = list(pool.map(self._register, self.users))
+
+        self.action.refresh_from_db()
+        self.assertEqual(statuses.count(201), self.CAPACITY)
+        self.assertEqual(statuses.count(400), self.REGISTRATIONS - self.CAPACITY)
+        self.assertEqual(self.action.participant_count, self.CAPACITY)
+        self.assertEqual(self.action.participants.count(), self.CAPACITY)
+        self.assertEqual(
+            set(ActionParticipation.objects.values_list("user_id", flat=True)),
+            {user.pk for user, status in zip(self.users, statuses) if status == 201},
+        )
+
+
+class NearbyActionsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user("viewer"))
+        organizer = make_user("organizer")
+        # Gdańsk city centre, Gdynia (~20 km), Sopot (~11 km) and Stockholm
+        make_action(organizer, title="Gdańsk", latitude=54.352, longitude=18.6466)
+        make_action(organizer, title="Gdynia", latitude=54.5189, longitude=18.5305)
+        make_action(organizer, title="Sopot", latitude=54.4418, longitude=18.5601)
+        make_action(organizer, title="Stockholm", latitude=59.3293, longitude=18.0686)
+
+    def test_results_are_filtered_and_ordered_by_distance(self):
+        response = self.client.get(reverse("climate_actions"), {"near": "54.352,18.6466", "radius_km": 25})
+        results = response.data["results"]
+        self.assertEqual([item["title"] for item in results], ["Gdańsk", "Sopot", "Gdynia"])
+        self.assertAlmostEqual(results[0]["distance_km"], 0, places=3)
+        self.assertAlmostEqual(results[1]["distance_km"], 11.45, delta=0.05)
+        self.assertAlmostEqual(results[2]["distance_km"], 20.02, delta=0.05)
+
+    def test_radius_excludes_points_inside_the_bounding_box(self):
+        # Sopot is 8.78 km from Gdynia but only 8.57 km south of it, so it
+        # passes the bounding box and only the haversine check removes it
+        response = self.client.get(reverse("climate_actions"), {"near": "54.5189,18.5305", "radius_km": 8.7})
+        self.assertEqual([item["title"] for item in response.data["results"]], ["Gdynia"])
+
+    def test_distance_is_omitted_without_near(self):
+        response = self.client.get(reverse("climate_actions"))
+        self.assertNotIn("distance_km", response.data["results"][0])
+
+    def test_invalid_near_is_rejected(self):
+        response = self.client.get(reverse("climate_actions"), {"near": "north"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ActionSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user("viewer"))
+        organizer = make_user("organizer")
+        self.cleanup = make_action(
+            organizer,
+            title="Beach clean-up in Sopot",
+            description="Bring gloves, we collect plastic along the shore.",
+            tags="plastic,coast",
+        )
+        self.workshop = make_action(
+            organizer,
+            title="Rain garden workshop",
+            description="Learn how to build a garden that soaks up stormwater, no plastic involved.",
+            organization_name="Zielony Gdańsk",
+        )
+        make_action(organizer, title="Cycling protest", description="Ride for safer bike lanes.")
+
+    def search(self, query, **params):
+        return self.client.get(reverse("climate_actions"), {"q": query, **params}).data["results"]
+
+    def test_matches_are_ranked_with_title_hits_first(self):
+        results = self.search("plastic")
+        self.assertEqual([item["id"] for item in results], [self.cleanup.pk, self.workshop.pk])
+        self.assertGreater(results[0]["search_rank"], results[1]["search_rank"])
+        self.assertIn("<mark>plastic</mark>", results[1]["search_snippet"])
+
+    def test_all_terms_must_match_and_last_term_is_a_prefix(self):
+        self.assertEqual([item["id"] for item in self.search("garden storm")], [self.workshop.pk])
+        self.assertEqual([item["id"] for item in self.search("zielony")], [self.workshop.pk])
+        self.assertEqual(self.search("plastic cycling"), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.workshop.title = "Rain garden and kayak workshop"
+        self.workshop.save()
+        self.assertEqual([item["id"] for item in self.search("kayak")], [self.workshop.pk])
+        self.workshop.delete()
+        self.assertEqual(self.search("kayak"), [])
+
+    def test_only_searched_columns_reindex(self):
+        with connection.cursor() as cursor:
+            # An index installed before the trigger was narrowed is upgraded
+            cursor.execute(f"DROP TRIGGER {FTS_TABLE}_au")
+            cursor.execute(f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON actions_climateaction BEGIN SELECT 1; END")
+            # Inside the test transaction, so without the editor's context manager
+            install_search_index(connection.schema_editor(), ClimateAction)
+            cursor.execute("SELECT sql FROM sqlite_master WHERE name = %s", [f"{FTS_TABLE}_au"])
+            self.assertIn("AFTER UPDATE OF title, description, organization_name, tags ON", cursor.fetchone()[0])
+
+        ClimateAction.objects.filter(pk=self.workshop.pk).update(title="Kayak workshop", participant_count=3)
+        self.assertEqual([item["id"] for item in self.search("kayak")], [self.workshop.pk])
+
+    def test_query_syntax_is_not_interpreted(self):
+        # A raw FTS5 query would fail to parse or exclude "gloves" here
+        self.assertEqual([item["id"] for item in self.search('plastic" -(gloves')], [self.cleanup.pk])
+
+    def test_search_combines_with_filters(self):
+        results = self.search("plastic", type="ngo_initiative", near="54.41,18.62", radius_km=5)
+        self.assertEqual(len(results), 2)
+        self.assertIn("distance_km", results[0])
+
+
+class ActionTagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(make_user("viewer"))
+        organizer = make_user("organizer")
+        self.coast = make_action(organizer, tags="Coast, plastic ,coast")
+        self.cars = make_action(organizer, tags="cars,car-free")
+        self.both = make_action(organizer, tags="coast,car-free")
+
+    def test_tags_are_normalized_and_deduplicated(self):
+        self.assertEqual(sorted(self.coast.normalized_tags.values_list("name", flat=True)), ["coast", "plastic"])
+
+    def test_filter_matches_whole_tags_only(self):
+        response = self.client.get(reverse("climate_actions"), {"tag": "car"})
+        self.assertEqual(response.data["results"], [])
+        response = self.client.get(reverse("climate_actions"), {"tag": "Car-Free"})
+        self.assertEqual({item["id"] for item in response.data["results"]}, {self.cars.pk, self.both.pk})
+        response = self.client.get(reverse("climate_actions") + "?tag=coast&tag=car-free")
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.both.pk])
+
+    def test_limit_must_be_positive(self):
+        self.assertEqual(len(self.client.get(reverse("action_tags"), {"limit": 1}).data), 1)
+        for limit in (0, -3, "many"):
+            self.assertEqual(self.client.get(reverse("action_tags"), {"limit": limit}).status_code, 400)
+
+    def test_tag_counts_come_from_one_cached_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("action_tags"))
+        self.assertEqual(
+            response.data,
+            [
+                {"name": "car-free", "action_count": 2},
+                {"name": "coast", "action_count": 2},
+                {"name": "cars", "action_count": 1},
+                {"name": "plastic", "action_count": 1},
+            ],
+        )
+        with self.assertNumQueries(0):
+            self.client.get(reverse("action_tags"))
+
+        self.cars.tags = "plastic"
+        self.cars.save()
+        response = self.client.get(reverse("action_tags"))
+        self.assertEqual(
+            response.data,
+            [
+                {"name": "coast", "action_count": 2},
+                {"name": "plastic", "action_count": 2},
+                {"name": "car-free", "action_count": 1},
+            ],
+        )
+
+
+class ActionFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(make_user("viewer"))
+        organizer = make_user("organizer")
+        for action_type, country, status in [
+            ("workshop", "Poland", "upcoming"),
+            ("workshop", "Poland", "ongoing"),
+            ("workshop", "Sweden", "upcoming"),
+            ("protest", "Poland", "upcoming"),
+            ("hackathon", "Denmark", "completed"),
+        ]:
+            make_action(organizer, action_type=action_type, country=country, tags="coast", **dates_for(status))
+
+    def facets(self, query=""):
+        return self.client.get(reverse("action_facets") + query).data
+
+    def counts(self, facet):
+        return {item["value"]: item["count"] for item in facet}
+
+    def test_unfiltered_counts(self):
+        data = self.facets()
+        self.assertEqual(data["total"], 5)
+        self.assertEqual(self.counts(data["type"]), {"workshop": 3, "protest": 1, "hackathon": 1})
+        self.assertEqual(data["type"][0], {"value": "workshop", "label": "Workshop/Event", "count": 3})
+        self.assertEqual(self.counts(data["country"]), {"Poland": 3, "Sweden": 1, "Denmark": 1})
+
+    def test_facets_ignore_their_own_selection(self):
+        with self.assertNumQueries(1):
+            data = self.facets("?type=workshop&country=Poland")
+        self.assertEqual(data["total"], 2)
+        # Types stay selectable within Poland, countries within workshops
+        self.assertEqual(self.counts(data["type"]), {"workshop": 2, "protest": 1})
+        self.assertEqual(self.counts(data["country"]), {"Poland": 2, "Sweden": 1})
+        self.assertEqual(self.counts(data["status"]), {"upcoming": 1, "ongoing": 1})
+
+    def test_total_matches_the_list_endpoint(self):
+        query = "?type=workshop&type=protest&status=upcoming&tag=coast"
+        listed = self.client.get(reverse("climate_actions") + query).data["count"]
+        self.assertEqual(self.facets(query)["total"], listed)
+        self.assertEqual(listed, 3)
+
+    def test_counts_are_cached_per_filter_combination(self):
+        self.facets("?type=workshop&country=Poland")
+        with self.assertNumQueries(0):
+            self.facets("?country=Poland&type=workshop")
+        make_action(make_user("other"), action_type="protest", country="Poland")
+        self.assertEqual(self.counts(self.facets("?type=workshop&country=Poland")["type"])["protest"], 2)
+
+
+class ActionCalendarTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(make_user("viewer"))
+        organizer = make_user("organizer")
+
+        def at(day, hour=10):
+            return timezone.make_aware(datetime(2031, 3, day, hour))
+
+        self.festival = make_action(organizer, title="Festival", start_date=at(1), end_date=at(3))
+        self.workshop = make_action(organizer, title="Workshop", start_date=at(2), end_date=at(2, 12))
+        self.campaign = make_action(
+            organizer, title="Campaign", action_type="protest",
+            start_date=timezone.make_aware(datetime(2031, 2, 1)), end_date=at(2),
+        )
+        make_action(organizer, title="Later", start_date=at(20), end_date=at(21))
+
+    def get(self, **params):
+        return self.client.get(reverse("action_calendar"), {"from": "2031-03-01", "to": "2031-03-04", **params})
+
+    def test_counts_and_groups_overlapping_actions_per_day(self):
+        with self.assertNumQueries(4):
+            data = self.get().data
+        self.assertEqual([day["count"] for day in data["days"]], [2, 3, 1, 0])
+        self.assertEqual(data["days"][0]["starting"], [self.campaign.pk, self.festival.pk])
+        self.assertEqual(data["days"][1]["starting"], [self.workshop.pk])
+        self.assertEqual({action["title"] for action in data["actions"]}, {"Festival", "Workshop", "Campaign"})
+
+    def test_facet_filters_apply(self):
+        data = self.get(type="protest").data
+        self.assertEqual([day["count"] for day in data["days"]], [1, 1, 0, 0])
+
+    def test_parameters_it_ignores_share_the_cache_entry(self):
+        self.get(country="Latvia")
+        with self.assertNumQueries(0):
+            self.get(country="Latvia", q="x" * 300, near="54.6,18.6")
+
+    def test_window_is_validated(self):
+        self.assertEqual(self.get(to="2031-02-01").status_code, 400)
+        self.assertEqual(self.get(to="2031-12-01").status_code, 400)
+        self.assertEqual(self.client.get(reverse("action_calendar")).status_code, 400)
+
+
+def make_image(name="photo.png", size=(2000, 1000)):
+    buffer = BytesIO()
+    Image.new("RGB", size, "seagreen").save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        overrides = override_settings(MEDIA_ROOT=self.media_root, BACKGROUND_TASKS_EAGER=True)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.organizer = make_user("organizer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer)
+
+    def test_derivatives_are_generated_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            action = make_action(self.organizer, image=make_image())
+        action.refresh_from_db()
+        sizes = action.image_derivatives["sizes"]
+        self.assertEqual(set(sizes), set(settings.IMAGE_DERIVATIVE_SIZES))
+        with Image.open(os.path.join(self.media_root, sizes["thumb"]["webp"])) as thumb:
+            self.assertEqual((thumb.format, thumb.size), ("WEBP", (160, 80)))
+
+        response = self.client.get(reverse("climate_actions"))
+        urls = response.data["results"][0]["image_urls"]
+        self.assertEqual(urls["large"]["jpeg"], f"http://testserver/media/{sizes['large']['jpeg']}")
+
+    def test_names_are_content_hashed_and_shared(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = make_action(self.organizer, image=make_image("a.png"))
+            second = make_action(self.organizer, image=make_image("b.png"))
+            other = make_action(self.organizer, image=make_image("c.png", size=(300, 300)))
+        manifests = [
+            action.image_derivatives["sizes"]
+            for action in ClimateAction.objects.filter(pk__in=[first.pk, second.pk, other.pk]).order_by("pk")
+        ]
+        self.assertEqual(manifests[0], manifests[1])
+        self.assertNotEqual(manifests[0], manifests[2])
+
+    def test_avatar_derivatives_and_backfill_command(self):
+        self.organizer.avatar = make_image("me.png", size=(600, 600))
+        self.organizer.save()  # outside captureOnCommitCallbacks: nothing runs yet
+        self.assertEqual(User.objects.get(pk=self.organizer.pk).avatar_derivatives, {})
+
+        out = StringIO()
+        call_command("generate_image_derivatives", workers=1, stdout=out)
+        self.assertIn("1 of 1", out.getvalue())
+        self.organizer.refresh_from_db()
+        profile = self.client.get(reverse("user_profile")).data
+        self.assertEqual(set(profile["avatar_urls"]), set(settings.IMAGE_DERIVATIVE_SIZES))
+
+
+def action_row(title, **overrides):
+    start = timezone.now() + timedelta(days=7)
+    row = {
+        "title": title,
+        "description": "Imported from a partner feed.",
+        "action_type": "workshop",
+        "location_name": "Old Town",
+        "latitude": 59.437,
+        "longitude": 24.745,
+        "country": "Estonia",
+        "city": "Tallinn",
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(hours=2)).isoformat(),
+    }
+    row.update(overrides)
+    return row
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.organizer = make_user("organizer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer)
+
+    def test_valid_rows_are_imported_and_invalid_rows_reported(self):
+        past = {field: value.isoformat() for field, value in dates_for("completed").items()}
+        rows = [
+            action_row("Tree planting", tags="Trees, urban"),
+            action_row("Missing coordinates", latitude=None),
+            action_row("Finished", **past),
+            action_row("Not mine", organizer_email="someone@example.com"),
+        ]
+        response = self.client.post(reverse("bulk_import_actions"), {"actions": rows}, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [1, 3])
+        self.assertIn("latitude", response.data["errors"][0]["errors"])
+        self.assertIn("organizer_email", response.data["errors"][1]["errors"])
+
+        statuses = dict(ClimateAction.objects.values_list("title", "status"))
+        self.assertEqual(statuses, {"Tree planting": "upcoming", "Finished": "completed"})
+        self.assertEqual(
+            list(ClimateAction.objects.get(title="Tree planting").normalized_tags.values_list("name", flat=True)),
+            ["trees", "urban"],
+        )
+        self.organizer.refresh_from_db()
+        self.assertEqual(self.organizer.actions_organized, 2)
+        self.assertEqual(self.organizer.impact_score, 2 * User.ORGANIZED_ACTION_POINTS)
+
+    def test_import_is_visible_through_cached_listings(self):
+        self.client.get(reverse("action_tags"))
+        self.client.post(reverse("bulk_import_actions"), [action_row("Dune repair", tags="coast")], format="json")
+        self.assertEqual(self.client.get(reverse("action_tags")).data, [{"name": "coast", "action_count": 1}])
+        self.assertEqual(self.client.get(reverse("climate_actions"), {"q": "dune"}).data["count"], 1)
+
+    def test_only_invalid_rows_is_a_bad_request(self):
+        response = self.client.post(reverse("bulk_import_actions"), [{"title": "Nothing else"}], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["created"], 0)
+
+    def test_command_resolves_organizers_by_email_in_bulk(self):
+        other = make_user("partner")
+        rows = [action_row(f"Event {i}", organizer_email="PARTNER@example.com") for i in range(30)]
+        rows += [action_row("Default organizer"), action_row("Unknown", organizer_email="nobody@example.com")]
+        path = os.path.join(tempfile.mkdtemp(), "actions.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, "w") as f:
+            json.dump(rows, f)
+
+        out, err = StringIO(), StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command(
+                "import_actions", path, organizer="organizer@example.com", chunk_size=8, stdout=out, stderr=err
+            )
+        # Two user lookups, then a handful of statements per chunk of 8 rows
+        self.assertLessEqual(len(queries), 2 + 4 * 5)
+        self.assertIn("Imported 31 of 32 actions (1 rejected)", out.getvalue())
+        self.assertIn("Row 31", err.getvalue())
+        self.assertEqual(ClimateAction.objects.filter(organizer=other).count(), 30)
+        self.assertEqual(ClimateAction.objects.filter(organizer=self.organizer).count(), 1)
+
+
+class FailingThirdMessageBackend(locmem.EmailBackend):
+    """Delivers two messages, then fails as a dropped SMTP connection would"""
+
+    messages = 0
+
+    def send_messages(self, messages):
+        FailingThirdMessageBackend.messages += len(messages)
+        if FailingThirdMessageBackend.messages == 3:
+            raise ConnectionError("connection reset")
+        return super().send_messages(messages)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True, ACTION_UPDATE_EMAIL_BATCH_SIZE=2)
+class ActionUpdateNotificationTests(TestCase):
+    def setUp(self):
+        self.organizer = make_user("organizer")
+        self.action = make_action(self.organizer, title="Dune repair")
+        for name in ("anna", "ben", "carl", "dora"):
+            ActionParticipation.objects.create(user=make_user(name), action=self.action)
+        muted = make_user("muted")
+        User.objects.filter(pk=muted.pk).update(email_notifications=False)
+        ActionParticipation.objects.create(user=muted, action=self.action)
+        ActionParticipation.objects.create(user=make_user("gone"), action=self.action, participation_type="cancelled")
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer)
+
+    def post_update(self, **data):
+        data = {"title": "Bring gloves", "content": "We have run out of gloves.", **data}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse("action_updates", kwargs={"pk": self.action.pk}), data, format="json")
+
+    def test_participants_are_emailed_once(self):
+        response = self.post_update(is_important=True)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [
+            "anna@example.com", "ben@example.com", "carl@example.com", "dora@example.com",
+        ])
+        self.assertEqual(mail.outbox[0].subject, "[Important] Dune repair: Bring gloves")
+        self.assertIn("We have run out of gloves.", mail.outbox[0].body)
+
+        call_command("send_update_notifications", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 4)
+
+    @override_settings(EMAIL_BACKEND="actions.tests.FailingThirdMessageBackend", ACTION_UPDATE_EMAIL_BATCH_SIZE=3)
+    def test_retry_only_sends_to_missed_recipients(self):
+        FailingThirdMessageBackend.messages = 0
+        # The connection drops in the middle of the first batch
+        self.post_update()
+        update = ActionUpdate.objects.get()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(update.deliveries.filter(sent_at__isnull=False).count(), 2)
+        self.assertEqual(update.deliveries.count(), 2)
+
+        out = StringIO()
+        call_command("send_update_notifications", update.pk, stdout=out)
+        self.assertIn("Sent 2 update notifications", out.getvalue())
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(len({message.to[0] for message in mail.outbox}), 4)
+
+    def test_recipients_claimed_by_another_job_are_skipped(self):
+        with mock.patch("actions.notifications.background.submit"):
+            self.post_update()
+        update = ActionUpdate.objects.get()
+        anna, ben = User.objects.filter(username__in=["anna", "ben"]).order_by("pk")
+        # Another job is sending to anna; one that died long ago had claimed ben
+        self.assertEqual(claim_deliveries(update, [anna.pk], "other"), {anna.pk})
+        ActionUpdateDelivery.objects.create(
+            update=update, user=ben, claim="dead", claimed_at=timezone.now() - CLAIM_TIMEOUT - timedelta(minutes=1)
+        )
+
+        self.assertEqual(send_update_notifications(update.pk), 3)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [
+            "ben@example.com", "carl@example.com", "dora@example.com",
+        ])
+        self.assertEqual(update.deliveries.filter(sent_at__isnull=True).get().user, anna)
+        self.assertEqual(claim_deliveries(update, [anna.pk, ben.pk], "late"), set())
+
+    def test_only_the_organizer_can_post_updates(self):
+        self.client.force_authenticate(User.objects.get(username="anna"))
+        response = self.post_update()
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(ActionUpdate.objects.exists())
+
+
+class LiveUpdateTests(TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.organizer = make_user("organizer")
+        self.gdansk = make_action(self.organizer, latitude=54.41, longitude=18.62)
+        self.riga = make_action(self.organizer, latitude=56.95, longitude=24.11)
+
+    def subscribe(self, **kwargs):
+        subscription = get_broker().subscribe(Subscription(loop=self.loop, **kwargs))
+        self.addCleanup(get_broker().unsubscribe, subscription)
+        return subscription
+
+    def received(self, subscription):
+        self.loop.run_until_complete(asyncio.sleep(0))
+        events = []
+        while not subscription.queue.empty():
+            events.append(subscription.queue.get_nowait())
+        return events
+
+    def test_deltas_reach_action_and_map_subscribers(self):
+        watching_gdansk = self.subscribe(action_ids=[self.gdansk.pk])
+        watching_latvia = self.subscribe(bbox=(55.6, 20.9, 58.1, 28.3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ActionParticipation.objects.create(user=make_user("anna"), action=self.gdansk)
+            ActionParticipation.objects.create(user=make_user("ben"), action=self.riga)
+            ActionUpdate.objects.create(action=self.gdansk, title="Gloves", content="Bring gloves.", created_by=self.organizer)
+
+        events = self.received(watching_gdansk)
+        self.assertEqual([event["type"] for event in events], ["participants", "update"])
+        self.assertEqual(events[0]["participant_count"], 1)
+        self.assertEqual(events[1]["update"]["title"], "Gloves")
+        self.assertEqual(
+            [(event["type"], event["action"]) for event in self.received(watching_latvia)],
+            [("participants", self.riga.pk)],
+        )
+
+    def test_scheduled_status_changes_are_pushed(self):
+        subscription = self.subscribe(action_ids=[self.riga.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_action_statuses(now=timezone.now() + timedelta(days=7, hours=1))
+        event = self.received(subscription)[0]
+        self.assertEqual((event["type"], event["status"]), ("status", "ongoing"))
+
+    def test_bulk_imported_actions_are_pushed(self):
+        watching_tallinn = self.subscribe(bbox=(59.0, 24.0, 60.0, 25.5))
+        with self.captureOnCommitCallbacks(execute=True):
+            import_actions([action_row("Beach cleanup"), action_row("Bike ride")], organizer=self.organizer)
+
+        events = self.received(watching_tallinn)
+        imported = ClimateAction.objects.filter(country="Estonia").order_by("pk")
+        self.assertEqual([(event["type"], event["action"]) for event in events], [("action", a.pk) for a in imported])
+        self.assertEqual((events[0]["status"], events[0]["participant_count"]), ("upcoming", 0))
+
+    def test_slow_clients_are_told_to_resync(self):
+        subscription = self.subscribe(action_ids=[self.gdansk.pk])
+        subscription.queue = asyncio.Queue(2)
+        for count in range(3):
+            get_broker().publish({"type": "participants", "action": self.gdansk.pk, "participant_count": count})
+        self.assertEqual(self.received(subscription), [{"type": "resync"}])
+
+
+class ActionStreamTests(TestCase):
+    def setUp(self):
+        self.organizer = make_user("organizer")
+        self.action = make_action(self.organizer)
+        self.token = str(AccessToken.for_user(self.organizer))
+
+    async def test_stream_relays_subscribed_events(self):
+        response = await self.async_client.get(reverse("action_stream"), {"action": self.action.pk, "token": self.token})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+
+        get_broker().publish({"type": "participants", "action": self.action.pk + 1, "participant_count": 9})
+        get_broker().publish({"type": "participants", "action": self.action.pk, "participant_count": 3})
+        chunk = await asyncio.wait_for(anext(stream), timeout=1)
+        self.assertEqual(
+            chunk.decode(),
+            f'event: participants\ndata: {{"type": "participants", "action": {self.action.pk}, "participant_count": 3}}\n\n',
+        )
+        await stream.aclose()
+
+    async def test_disconnecting_unsubscribes(self):
+        before = get_broker().subscriber_count()
+        stream = event_stream(Subscription(action_ids=[self.action.pk]))
+        await anext(stream)
+        self.assertEqual(get_broker().subscriber_count(), before + 1)
+        await stream.aclose()
+        self.assertEqual(get_broker().subscriber_count(), before)
+
+    async def test_stream_requires_a_valid_token_and_subscription(self):
+        url = reverse("action_stream")
+        self.assertEqual((await self.async_client.get(url, {"action": self.action.pk})).status_code, 401)
+        self.assertEqual((await self.async_client.get(url, {"token": "nonsense", "action": 1})).status_code, 401)
+        response = await self.async_client.get(url, {"token": self.token, "bbox": "55,30,54,20"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((await self.async_client.get(url, {"token": self.token})).status_code, 400)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = make_user("viewer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        organizer = make_user("organizer")
+        gdansk = {"latitude": 54.35, "longitude": 18.65, "city": "Gdańsk"}
+        riga = {"latitude": 56.95, "longitude": 24.11, "city": "Riga"}
+        for _ in range(3):
+            past = make_action(organizer, action_type="workshop", **gdansk, **dates_for("completed"))
+            ActionParticipation.objects.create(user=self.viewer, action=past)
+
+        self.local_workshop = make_action(organizer, title="Local workshop", action_type="workshop", **gdansk)
+        self.local_protest = make_action(organizer, title="Local protest", action_type="protest", **gdansk)
+        self.far_workshop = make_action(organizer, title="Far workshop", action_type="workshop", **riga)
+        self.popular = make_action(organizer, title="Popular", action_type="hackathon", **riga)
+        for i in range(5):
+            ActionParticipation.objects.create(user=make_user(f"fan{i}"), action=self.popular)
+        self.joined = make_action(organizer, title="Already joined", action_type="workshop", **gdansk)
+        ActionParticipation.objects.create(user=self.viewer, action=self.joined)
+        # Rankings come from the refresher process through a shared cache, which the tests pretend LocMemCache is
+        shared = mock.patch("actions.recommendations.cache_is_shared", return_value=True)
+        self.shared_cache = shared.start()
+        self.addCleanup(shared.stop)
+        local_refresher.reset()
+        self.addCleanup(local_refresher.reset)
+
+    def titles(self, user=None, **params):
+        if user is not None:
+            self.client.force_authenticate(user)
+        return [item["title"] for item in self.client.get(reverse("recommended_actions"), params).data]
+
+    def test_ranking_blends_affinity_distance_and_popularity(self):
+        call_command("refresh_recommendations", stdout=StringIO(), stderr=StringIO())
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("recommended_actions"))
+        titles = [item["title"] for item in response.data]
+        self.assertEqual(titles[:2], ["Local workshop", "Far workshop"])
+        self.assertNotIn("Already joined", titles)
+        self.assertEqual(self.titles(limit=1), ["Local workshop"])
+        for limit in (0, -3):
+            self.assertEqual(self.client.get(reverse("recommended_actions"), {"limit": limit}).status_code, 400)
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_process_local_cache_refreshes_in_process(self):
+        self.shared_cache.return_value = False
+        err = StringIO()
+        call_command("refresh_recommendations", stdout=StringIO(), stderr=err)
+        self.assertIn("process-local", err.getvalue())
+        with self.assertLogs("actions.recommendations", "WARNING"):
+            refresh_shared_recommendations()
+        # None of that reaches a web process's own LocMemCache
+        cache.clear()
+
+        self.assertEqual(self.titles()[:2], ["Local workshop", "Far workshop"])
+        with mock.patch("actions.recommendations.background.submit") as submit:
+            self.titles()
+        submit.assert_not_called()
+
+    def test_profile_city_and_popularity_fallbacks(self):
+        refresh_recommendations()
+        riga_user = make_user("riga")
+        User.objects.filter(pk=riga_user.pk).update(location="Riga, Latvia")
+        newcomer = make_user("newcomer")
+        refresh_recommendations()
+
+        self.assertEqual(self.titles(riga_user)[:2], ["Popular", "Far workshop"])
+        self.assertEqual(self.titles(newcomer)[0], "Popular")
+
+    def test_joined_since_the_last_refresh_is_dropped(self):
+        refresh_recommendations()
+        ActionParticipation.objects.create(user=self.viewer, action=self.local_workshop)
+        self.assertNotIn("Local workshop", self.titles())
+
+    def test_started_since_the_last_refresh_is_dropped(self):
+        refresh_recommendations()
+        # The stored status lags until refresh_action_statuses runs
+        ClimateAction.objects.filter(pk=self.local_workshop.pk).update(**dates_for("ongoing"))
+        self.assertNotIn("Local workshop", self.titles())
+        refresh_recommendations()
+        self.assertNotIn("Local workshop", self.titles())
+
+    def test_batches_agree_with_a_single_pass(self):
+        for i in range(7):
+            user = make_user(f"extra{i}")
+            ActionParticipation.objects.create(user=user, action=[self.local_protest, self.far_workshop][i % 2])
+        refresh_recommendations(batch_size=1000)
+        single = {user.pk: cache.get(recommendation_key(user.pk)) for user in User.objects.all()}
+        cache.clear()
+        refresh_recommendations(batch_size=3)
+        self.assertEqual({user.pk: cache.get(recommendation_key(user.pk)) for user in User.objects.all()}, single)
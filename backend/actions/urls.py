@@ -3,9 +3,18 @@ from . import views
 
 urlpatterns = [
     path("", views.ClimateActionListCreateView.as_view(), name="climate_actions"),
+    path("bulk/", views.bulk_import_actions, name="bulk_import_actions"),
     path("<int:pk>/", views.ClimateActionDetailView.as_view(), name="climate_action_detail"),
+    path("<int:pk>/participants/", views.ActionParticipantListView.as_view(), name="action_participants"),
+    path("<int:pk>/resources/", views.ActionResourceListView.as_view(), name="action_resources"),
+    path("<int:pk>/updates/", views.ActionUpdateListView.as_view(), name="action_updates"),
     path("<int:action_id>/join/", views.ActionParticipationView.as_view(), name="join_action"),
     path("<int:action_id>/cancel/", views.cancel_participation, name="cancel_participation"),
-    path("user/", views.user_actions, name="user_actions"),
+    path("user/", views.UserActionListView.as_view(), name="user_actions"),
     path("map/", views.map_actions, name="map_actions"),
+    path("tags/", views.action_tags, name="action_tags"),
+    path("facets/", views.action_facets, name="action_facets"),
+    path("calendar/", views.action_calendar, name="action_calendar"),
+    path("recommended/", views.recommended_actions, name="recommended_actions"),
+    path("stream/", views.action_stream, name="action_stream"),
 ]
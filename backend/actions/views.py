@@ -1,8 +1,29 @@
+import hashlib
+from datetime import date
+
+from asgiref.sync import sync_to_async
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from django.utils import timezone
-from django.db import models
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Exists, OuterRef, Prefetch, Value, When
+from accounts.authentication import CachedJWTAuthentication
+from .bulk import import_actions
+from .cache import versioned_key
+from .calendar import MAX_CALENDAR_DAYS, calendar
+from .filters import FACETS, cache_key_parts, facet_counts, filter_actions, filter_facets
+from .live import event_stream, subscription_from_params
+from .recommendations import TOP_N, recommended_action_ids
+from .status import not_ended_q, upcoming_q
+from .tags import tag_counts
 from .models import ClimateAction, ActionParticipation, ActionResource, ActionUpdate
 from .serializers import (
     ClimateActionSerializer,
@@ -13,9 +34,18 @@ from .serializers import (
     ActionUpdateSerializer
 )
 
+DEFAULT_TAG_LIMIT = 50
+MAX_TAG_LIMIT = 200
+DEFAULT_RECOMMENDATION_LIMIT = 10
+
+
+def action_queryset():
+    """Actions with the organizer joined in for serializing lists"""
+    return ClimateAction.objects.select_related("organizer")
+
 
 class ClimateActionListCreateView(generics.ListCreateAPIView):
-    queryset = ClimateAction.objects.all()
+    queryset = action_queryset()
     permission_classes = [permissions.IsAuthenticated]
     
     def get_serializer_class(self):
@@ -24,45 +54,81 @@ class ClimateActionListCreateView(generics.ListCreateAPIView):
         return ClimateActionSerializer
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        
-        # Filter by action type
-        action_type = self.request.query_params.get("type")
-        if action_type:
-            queryset = queryset.filter(action_type=action_type)
-        
-        # Filter by status
-        status_filter = self.request.query_params.get("status")
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
-        
-        # Filter by location
-        location = self.request.query_params.get("location")
-        if location:
-            queryset = queryset.filter(
-                models.Q(city__icontains=location) | 
-                models.Q(country__icontains=location)
-            )
-        
-        # Filter upcoming events
-        upcoming = self.request.query_params.get("upcoming")
-        if upcoming == "true":
-            queryset = queryset.filter(start_date__gt=timezone.now())
-        
-        return queryset.order_by("start_date")
+        return filter_actions(super().get_queryset(), self.request.query_params)
 
 
 class ClimateActionDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = ClimateAction.objects.all()
     serializer_class = ActionDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    def get_queryset(self):
+        # Fetch one item past the preview limit so the serializer can tell
+        # whether to link to the next page of each collection
+        limit = settings.ACTION_DETAIL_PREVIEW_LIMIT + 1
+        return action_queryset().prefetch_related(
+            Prefetch(
+                "participants",
+                queryset=ActionParticipation.objects.select_related("user")[:limit],
+                to_attr="participants_preview",
+            ),
+            Prefetch(
+                "resources",
+                queryset=ActionResource.objects.select_related("created_by")[:limit],
+                to_attr="resources_preview",
+            ),
+            Prefetch(
+                "updates",
+                queryset=ActionUpdate.objects.select_related("created_by")[:limit],
+                to_attr="updates_preview",
+            ),
+        )
+    
     def get_permissions(self):
         if self.request.method in ["PUT", "PATCH", "DELETE"]:
             return [permissions.IsAuthenticated(), IsOrganizerOrReadOnly()]
         return [permissions.IsAuthenticated()]
 
 
+class NestedCollectionPagination(PageNumberPagination):
+    """Pages line up with the previews embedded in the action detail"""
+    
+    page_size = settings.ACTION_DETAIL_PREVIEW_LIMIT
+
+
+class ActionParticipantListView(generics.ListAPIView):
+    serializer_class = ActionParticipationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NestedCollectionPagination
+    
+    def get_queryset(self):
+        return ActionParticipation.objects.filter(action_id=self.kwargs["pk"]).select_related("user", "action")
+
+
+class ActionResourceListView(generics.ListAPIView):
+    serializer_class = ActionResourceSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NestedCollectionPagination
+    
+    def get_queryset(self):
+        return ActionResource.objects.filter(action_id=self.kwargs["pk"]).select_related("created_by")
+
+
+class ActionUpdateListView(generics.ListCreateAPIView):
+    serializer_class = ActionUpdateSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NestedCollectionPagination
+    
+    def get_queryset(self):
+        return ActionUpdate.objects.filter(action_id=self.kwargs["pk"]).select_related("created_by")
+    
+    def perform_create(self, serializer):
+        # Participants are emailed about new updates, so only the organizer may post
+        action = generics.get_object_or_404(ClimateAction, pk=self.kwargs["pk"])
+        if action.organizer_id != self.request.user.pk:
+            raise PermissionDenied("Only the organizer can post updates.")
+        serializer.save(action=action, created_by=self.request.user)
+
+
 class ActionParticipationView(generics.CreateAPIView):
     serializer_class = ActionParticipationSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -75,23 +141,25 @@ class ActionParticipationView(generics.CreateAPIView):
         except ClimateAction.DoesNotExist:
             return Response({"error": "Action not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        # Check if user is already registered
-        if ActionParticipation.objects.filter(user=request.user, action=action).exists():
-            return Response({"error": "Already registered for this action"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Check if action is full
-        if action.max_participants and action.participant_count >= action.max_participants:
-            return Response({"error": "Action is full"}, status=status.HTTP_400_BAD_REQUEST)
-        
         # Check registration deadline
         if action.registration_deadline and timezone.now() > action.registration_deadline:
             return Response({"error": "Registration deadline has passed"}, status=status.HTTP_400_BAD_REQUEST)
         
-        participation = ActionParticipation.objects.create(
-            user=request.user,
-            action=action,
-            participation_type="registered"
-        )
+        with transaction.atomic():
+            if not action.reserve_seat():
+                if ActionParticipation.objects.filter(user=request.user, action=action).exists():
+                    return Response({"error": "Already registered for this action"}, status=status.HTTP_400_BAD_REQUEST)
+                return Response({"error": "Action is full"}, status=status.HTTP_400_BAD_REQUEST)
+            
+            participation = ActionParticipation(user=request.user, action=action, participation_type="registered")
+            participation.seat_reserved = True
+            try:
+                with transaction.atomic():
+                    participation.save()
+            except IntegrityError:
+                # Already registered; roll back the seat we just reserved
+                transaction.set_rollback(True)
+                return Response({"error": "Already registered for this action"}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(participation)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -110,33 +178,60 @@ def cancel_participation(request, action_id):
         return Response({"error": "Participation not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
-@api_view(["GET"])
-@permission_classes([permissions.IsAuthenticated])
-def user_actions(request):
-    """Get actions organized by or participated in by the user"""
-    user = request.user
+class UserActionPagination(CursorPagination):
+    ordering = ("-start_date", "-id")
+
+
+class UserActionListView(generics.ListAPIView):
+    """Actions the user organizes or joined, each listed once with its role"""
     
-    organized = ClimateAction.objects.filter(organizer=user)
-    participated = ClimateAction.objects.filter(participants__user=user)
+    serializer_class = ClimateActionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = UserActionPagination
     
-    data = {
-        "organized": ClimateActionSerializer(organized, many=True).data,
-        "participated": ClimateActionSerializer(participated, many=True).data,
-    }
+    ROLES = ("organizer", "participant", "both")
     
-    return Response(data)
+    def get_queryset(self):
+        user = self.request.user
+        joined = Exists(ActionParticipation.objects.filter(action=OuterRef("pk"), user=user))
+        joined_ids = ActionParticipation.objects.filter(user=user).order_by().values("action_id")
+        organized_ids = ClimateAction.objects.filter(organizer=user).order_by().values("pk")
+        queryset = action_queryset().annotate(
+            joined=joined,
+            role=Case(
+                When(organizer=user, joined=True, then=Value("both")),
+                When(organizer=user, then=Value("organizer")),
+                default=Value("participant"),
+            ),
+        )
+        
+        role = self.request.query_params.get("role")
+        if role is not None and role not in self.ROLES:
+            raise ValidationError({"role": f"Expected one of {', '.join(self.ROLES)}."})
+        if role == "organizer":
+            return queryset.filter(organizer=user)
+        if role == "participant":
+            return queryset.filter(pk__in=joined_ids)
+        if role == "both":
+            return queryset.filter(organizer=user, pk__in=joined_ids)
+        # A union of the two indexed id lists, not an OR that scans every action
+        return queryset.filter(pk__in=organized_ids.union(joined_ids))
 
 
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated])
 def map_actions(request):
     """Get actions for map visualization"""
-    actions = ClimateAction.objects.filter(status__in=["upcoming", "ongoing"])
+    map_data = cache.get_or_set(versioned_key("map"), _build_map_data, settings.ACTIONS_CACHE_TIMEOUT)
+    return Response(map_data)
+
+
+def _build_map_data():
+    actions = action_queryset().filter(not_ended_q())
     
     # Format for map display
-    map_data = []
-    for action in actions:
-        map_data.append({
+    return [
+        {
             "id": action.id,
             "title": action.title,
             "type": action.action_type,
@@ -149,9 +244,130 @@ def map_actions(request):
             "organizer": action.organizer.full_name,
             "participant_count": action.participant_count,
             "max_participants": action.max_participants,
-        })
+        }
+        for action in actions
+    ]
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def action_tags(request):
+    """Get the most used tags with their action counts"""
+    try:
+        limit = int(request.query_params.get("limit", DEFAULT_TAG_LIMIT))
+    except ValueError:
+        raise ValidationError({"limit": "Expected an integer."})
+    if limit < 1:
+        raise ValidationError({"limit": "Expected a positive integer."})
+    limit = min(limit, MAX_TAG_LIMIT)
+    data = cache.get_or_set(versioned_key("tags", limit), lambda: tag_counts(limit), settings.ACTIONS_CACHE_TIMEOUT)
+    return Response(data)
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def action_facets(request):
+    """Get per-facet action counts for the filters in the query string"""
+    params = request.query_params
+    data = cache.get_or_set(
+        versioned_key("facets", hashlib.sha1("&".join(cache_key_parts(params)).encode()).hexdigest()),
+        lambda: facet_counts(ClimateAction.objects.all(), params),
+        settings.ACTIONS_CACHE_TIMEOUT,
+    )
+    return Response(data)
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def action_calendar(request):
+    """Get actions overlapping a date window, grouped by day"""
+    params = request.query_params
+    try:
+        first_day = date.fromisoformat(params["from"])
+        last_day = date.fromisoformat(params["to"])
+    except (KeyError, ValueError):
+        raise ValidationError({"from": "Expected from=YYYY-MM-DD and to=YYYY-MM-DD."})
+    if not 0 <= (last_day - first_day).days < MAX_CALENDAR_DAYS:
+        raise ValidationError({"to": f"The window must span 1 to {MAX_CALENDAR_DAYS} days."})
     
-    return Response(map_data)
+    # Only the facets narrow the calendar, so other parameters share its entry
+    facets = "&".join(cache_key_parts(params, FACETS))
+    data = cache.get_or_set(
+        versioned_key("calendar", first_day, last_day, hashlib.sha1(facets.encode()).hexdigest()),
+        lambda: calendar(filter_facets(ClimateAction.objects.all(), params), first_day, last_day),
+        settings.ACTIONS_CACHE_TIMEOUT,
+    )
+    return Response(data)
+
+
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_import_actions(request):
+    """Create many actions at once and report the rows that failed validation"""
+    rows = request.data.get("actions") if isinstance(request.data, dict) else request.data
+    if not isinstance(rows, list):
+        raise ValidationError({"actions": "Expected a list of actions."})
+    if len(rows) > settings.ACTION_BULK_IMPORT_MAX_ROWS:
+        raise ValidationError({"actions": f"At most {settings.ACTION_BULK_IMPORT_MAX_ROWS} actions per request."})
+    
+    # Staff may import on behalf of other organizers via organizer_email
+    result = import_actions(rows, organizer=request.user, allow_organizer_email=request.user.is_staff)
+    response_status = status.HTTP_201_CREATED if result["created"] or not rows else status.HTTP_400_BAD_REQUEST
+    return Response(result, status=response_status)
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def recommended_actions(request):
+    """Get upcoming actions ranked for the current user"""
+    try:
+        limit = int(request.query_params.get("limit", DEFAULT_RECOMMENDATION_LIMIT))
+    except ValueError:
+        raise ValidationError({"limit": "Expected an integer."})
+    if limit < 1:
+        raise ValidationError({"limit": "Expected a positive integer."})
+    limit = min(limit, TOP_N)
+    
+    # Rankings are refreshed periodically, so drop actions that since started
+    # or that the user has joined in the meantime
+    ids = recommended_action_ids(request.user.pk)
+    actions = action_queryset().filter(upcoming_q(), pk__in=ids).exclude(participants__user=request.user)
+    by_id = {action.pk: action for action in actions}
+    ranked = [by_id[action_id] for action_id in ids if action_id in by_id][:limit]
+    return Response(ClimateActionSerializer(ranked, many=True, context={"request": request}).data)
+
+
+@require_GET
+async def action_stream(request):
+    """Stream live participant counts, updates and status changes as server-sent events.
+    
+    Plain async Django view rather than a DRF one, so it must be served
+    over ASGI. Browsers' EventSource cannot set headers, so the access
+    token may also be passed as ?token=.
+    """
+    if await _stream_user(request) is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided or are invalid."}, status=401)
+    try:
+        subscription = subscription_from_params(request.GET)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400)
+    
+    response = StreamingHttpResponse(event_stream(subscription), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def _stream_user(request):
+    authentication = CachedJWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else request.GET.get("token")
+    if not raw_token:
+        return None
+    try:
+        return await sync_to_async(authentication.get_user)(authentication.get_validated_token(raw_token))
+    except (AuthenticationFailed, InvalidToken):
+        return None
 
 
 # Custom permission class
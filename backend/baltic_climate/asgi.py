@@ -2,6 +2,8 @@
 ASGI config for baltic_climate project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve the project through it (e.g. with uvicorn or daphne) for the live
+event stream at /api/actions/stream/, which holds connections open.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -0,0 +1,94 @@
+"""In-process background work.
+
+One-off jobs run on a shared thread pool and periodic tasks on daemon
+threads, so small deployments need no separate worker or scheduler. Each
+run closes its database connections afterwards, as a request would.
+
+Apps declare their periodic tasks with ``register_periodic`` from
+``ready()``. Only ``manage.py run_periodic_tasks`` starts them, so web
+workers, the test runner and one-off commands never run them.
+"""
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_periodic_tasks = {}
+_registered_tasks = {}
+_executor = None
+_lock = threading.Lock()
+
+
+def _run(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception("Background job %s failed", getattr(func, "__qualname__", func))
+        raise
+    finally:
+        connections.close_all()
+
+
+def submit(func, *args, **kwargs):
+    """Run ``func`` on the shared worker pool and return its Future.
+    
+    With ``BACKGROUND_TASKS_EAGER`` the job runs inline instead, which keeps
+    tests and one-off scripts deterministic.
+    """
+    global _executor
+    if settings.BACKGROUND_TASKS_EAGER:
+        future = Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.BACKGROUND_WORKERS, thread_name_prefix="background")
+    return _executor.submit(_run, func, args, kwargs)
+
+
+class PeriodicTask(threading.Thread):
+    def __init__(self, name, interval, func):
+        super().__init__(name=f"periodic:{name}", daemon=True)
+        self.interval = interval
+        self.func = func
+        self._stopped = threading.Event()
+    
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.func()
+            except Exception:
+                logger.exception("Periodic task %s failed", self.name)
+            finally:
+                connections.close_all()
+    
+    def stop(self):
+        self._stopped.set()
+
+
+def schedule(name, interval, func):
+    """Run ``func`` every ``interval`` seconds; a name is only scheduled once"""
+    with _lock:
+        if name not in _periodic_tasks:
+            task = PeriodicTask(name, interval, func)
+            _periodic_tasks[name] = task
+            task.start()
+        return _periodic_tasks[name]
+
+
+def register_periodic(name, interval_setting, func_path):
+    """Declare a task to run every ``settings.<interval_setting>`` seconds (0 disables it)"""
+    _registered_tasks[name] = (interval_setting, func_path)
+
+
+def registered_periodic_tasks():
+    """``{name: (interval_setting, func_path)}`` of every declared task"""
+    return dict(_registered_tasks)
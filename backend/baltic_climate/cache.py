@@ -0,0 +1,49 @@
+"""Version counters for invalidating groups of cache entries at once.
+
+Cached payloads embed the current version of their namespace in the key.
+Bumping the version orphans every entry built under the old one, so writers
+never need to know which keys readers have populated.
+"""
+
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+# Backends whose entries (and so versions) are private to one process
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def cache_is_shared():
+    """Whether other processes see this cache's writes, e.g. Redis or Memcached"""
+    return not isinstance(caches["default"], PROCESS_LOCAL_BACKENDS)
+
+
+def _version_key(namespace):
+    return f"version:{namespace}"
+
+
+def get_version(namespace):
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a version lost to eviction never collides
+        # with keys that were cached under an earlier counter value.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace):
+    """Move the namespace to a new version and return it"""
+    key = _version_key(namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+        return cache.get(key)
+
+
+def versioned_key(namespace, *parts):
+    return ":".join([namespace, f"v{get_version(namespace)}", *map(str, parts)])
@@ -0,0 +1,23 @@
+"""Counter columns that are only written with ``UPDATE ... SET f = f + n``.
+
+An instance loaded before the last increment holds a stale value, and a
+plain ``save()`` (an edit endpoint, the admin, a script) would write it
+back over the increments made since. ``CounterFieldsMixin`` leaves the
+counters out whenever an existing row is saved.
+"""
+
+
+class CounterFieldsMixin:
+    """Saves of existing rows skip ``COUNTER_FIELDS`` unless ``update_fields`` names them"""
+    
+    COUNTER_FIELDS = ()
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
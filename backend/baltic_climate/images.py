@@ -0,0 +1,106 @@
+"""Resized WebP/JPEG derivatives of uploaded images.
+
+Derivatives are stored under ``MEDIA_ROOT/derivatives/<content hash>/`` so
+their URLs change whenever the source changes and can be cached forever.
+Identical uploads share one set of files. Generation runs on the
+background pool after the upload's transaction commits.
+"""
+
+import hashlib
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from . import background
+
+# Model label -> (image field, field storing the derivative manifest)
+IMAGE_FIELDS = {
+    "actions.ClimateAction": ("image", "image_derivatives"),
+    "accounts.User": ("avatar", "avatar_derivatives"),
+}
+SAVE_OPTIONS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+
+
+def render_derivatives(source_file):
+    """Write every configured size and format of ``source_file`` to storage.
+    
+    Returns ``{size: {format: storage name}}``. Files that already exist for
+    the same content hash are reused rather than re-encoded.
+    """
+    source_file.open("rb")
+    try:
+        data = source_file.read()
+    finally:
+        source_file.close()
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    
+    original = None
+    derivatives = {}
+    for size, max_side in settings.IMAGE_DERIVATIVE_SIZES.items():
+        for image_format in settings.IMAGE_DERIVATIVE_FORMATS:
+            name = f"derivatives/{digest}/{size}.{image_format}"
+            if not default_storage.exists(name):
+                if original is None:
+                    original = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+                image = original.copy()
+                image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+                if image.mode not in ("RGB", "RGBA") or image_format == "jpeg":
+                    image = image.convert("RGB")
+                buffer = BytesIO()
+                image.save(buffer, **SAVE_OPTIONS[image_format])
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+            derivatives.setdefault(size, {})[image_format] = name
+    return derivatives
+
+
+def generate_for(model_label, pk):
+    """Build derivatives for one row and record them if its image is unchanged"""
+    model = apps.get_model(model_label)
+    image_field, manifest_field = IMAGE_FIELDS[model_label]
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return None
+    source = getattr(instance, image_field)
+    if not source:
+        return None
+    manifest = {"source": source.name, "sizes": render_derivatives(source)}
+    # Only store the manifest if no newer upload replaced the image meanwhile
+    model.objects.filter(pk=pk, **{image_field: source.name}).update(**{manifest_field: manifest})
+    return manifest
+
+
+def image_saved(instance):
+    """Bring derivatives in line with a just-saved instance's image.
+    
+    New or replaced images queue generation once the transaction commits;
+    removed images drop their manifest.
+    """
+    model_label = instance._meta.label
+    image_field, manifest_field = IMAGE_FIELDS[model_label]
+    source = getattr(instance, image_field)
+    manifest = getattr(instance, manifest_field)
+    if source and manifest.get("source") != source.name:
+        pk = instance.pk
+        transaction.on_commit(lambda: background.submit(generate_for, model_label, pk))
+    elif not source and manifest:
+        type(instance).objects.filter(pk=instance.pk).update(**{manifest_field: {}})
+        setattr(instance, manifest_field, {})
+
+
+def derivative_urls(manifest, request=None):
+    """Public URLs for a derivative manifest, keyed like the manifest"""
+    urls = {}
+    for size, formats in (manifest or {}).get("sizes", {}).items():
+        urls[size] = {}
+        for image_format, name in formats.items():
+            url = default_storage.url(name)
+            urls[size][image_format] = request.build_absolute_uri(url) if request is not None else url
+    return urls
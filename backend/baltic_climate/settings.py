@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     # Third party apps
     "rest_framework",
     "rest_framework_simplejwt",
+    "rest_framework_simplejwt.token_blacklist",
     "corsheaders",
     
     # Local apps
@@ -58,6 +59,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "accounts.middleware.LastActivityMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -89,10 +91,97 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # Take the write lock when a transaction starts so concurrent
+            # writers queue on the busy timeout instead of failing to upgrade.
+            # Django only sets this per connection, not per atomic() block,
+            # but it only changes how atomic() blocks begin. Every one in this
+            # project writes (joins, bulk imports, sign-ups, stats recomputes,
+            # ORM cascades), and reads run in autocommit, so readers never
+            # wait on it. Keep read-only code out of atomic() to keep it so.
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
+        "TEST": {
+            # A file-backed test database lets concurrency tests share it
+            # across threads the way real requests would
+            "NAME": BASE_DIR / "test_db.sqlite3",
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default="baltic-climate"),
+    }
+}
+
+# Seconds a cached action payload may live before it is recomputed
+ACTIONS_CACHE_TIMEOUT = config("ACTIONS_CACHE_TIMEOUT", default=300, cast=int)
+
+# Seconds a cached per-user profile payload may live; writes invalidate it early
+PROFILE_CACHE_TIMEOUT = config("PROFILE_CACHE_TIMEOUT", default=3600, cast=int)
+
+# Seconds between bulk writes of buffered User.last_activity times (accounts/last_activity.py)
+LAST_ACTIVITY_FLUSH_INTERVAL = config("LAST_ACTIVITY_FLUSH_INTERVAL", default=60, cast=int)
+
+# Seconds an authenticated user may be served from the cache. Saving the user
+# invalidates it early, but only in other workers if the cache is shared
+AUTH_USER_CACHE_TIMEOUT = config("AUTH_USER_CACHE_TIMEOUT", default=60, cast=int)
+
+# Threads in the in-process pool for background jobs (see baltic_climate.background);
+# eager mode runs every job inline instead
+BACKGROUND_WORKERS = config("BACKGROUND_WORKERS", default=4, cast=int)
+BACKGROUND_TASKS_EAGER = config("BACKGROUND_TASKS_EAGER", default=False, cast=bool)
+
+# Seconds between refreshes of action statuses from their dates, run by
+# `manage.py run_periodic_tasks`; 0 disables it (or run
+# `manage.py refresh_action_statuses` from cron). Status filters and
+# counts go by the dates either way. The refresh's live "status" events
+# only reach web clients through a broker shared between processes.
+ACTION_STATUS_REFRESH_INTERVAL = config("ACTION_STATUS_REFRESH_INTERVAL", default=0, cast=int)
+
+# Seconds between recomputations of recommended actions by
+# `manage.py run_periodic_tasks` (0 disables; or run
+# `manage.py refresh_recommendations` from cron) and how long each
+# user's cached ranking is kept. With a process-local cache each web
+# process recomputes its own at this interval, or at the cache timeout.
+RECOMMENDATION_REFRESH_INTERVAL = config("RECOMMENDATION_REFRESH_INTERVAL", default=0, cast=int)
+RECOMMENDATION_CACHE_TIMEOUT = config("RECOMMENDATION_CACHE_TIMEOUT", default=86400, cast=int)
+
+# Age in seconds after which a process rebuilds its leaderboards from the
+# database on the next read, picking up other workers' points (0 disables)
+LEADERBOARD_REBUILD_INTERVAL = config("LEADERBOARD_REBUILD_INTERVAL", default=300, cast=int)
+
+# Seconds between deletions of expired refresh tokens from the blacklist
+# tables by `manage.py run_periodic_tasks` (0 disables; or run
+# `manage.py flushexpiredtokens` from cron)
+TOKEN_BLACKLIST_PRUNE_INTERVAL = config("TOKEN_BLACKLIST_PRUNE_INTERVAL", default=0, cast=int)
+
+# Longest a process's blacklist filter goes without reading new rows, even
+# if the shared cache version was lost (the filter needs a shared cache)
+TOKEN_BLACKLIST_SYNC_INTERVAL = config("TOKEN_BLACKLIST_SYNC_INTERVAL", default=5, cast=int)
+
+# Items shown per nested collection (participants, resources, updates) on the
+# action detail endpoint; the rest is served by paginated sub-endpoints
+ACTION_DETAIL_PREVIEW_LIMIT = 10
+
+# Live action events (actions/live.py): broker class, events buffered per
+# client before it is told to resync, and seconds between keepalives
+LIVE_UPDATES_BROKER = config("LIVE_UPDATES_BROKER", default="actions.live.InProcessBroker")
+LIVE_UPDATES_QUEUE_SIZE = 100
+LIVE_UPDATES_KEEPALIVE = 15
+
+# Rows accepted per request by the bulk import endpoint; larger files go
+# through `manage.py import_actions` or several requests
+ACTION_BULK_IMPORT_MAX_ROWS = 1000
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -133,6 +222,14 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Resized copies generated for uploaded images: name -> longest side in pixels
+IMAGE_DERIVATIVE_SIZES = {
+    "thumb": 160,
+    "small": 480,
+    "large": 1200,
+}
+IMAGE_DERIVATIVE_FORMATS = ("webp", "jpeg")
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -144,7 +241,7 @@ AUTH_USER_MODEL = "accounts.User"
 # Django REST Framework
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accounts.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -171,6 +268,7 @@ SIMPLE_JWT = {
     "USER_ID_CLAIM": "user_id",
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
     "TOKEN_TYPE_CLAIM": "token_type",
+    "TOKEN_REFRESH_SERIALIZER": "accounts.tokens.FilteredTokenRefreshSerializer",
 }
 
 # CORS Settings
@@ -184,5 +282,8 @@ CORS_ALLOW_CREDENTIALS = True
 # Email Configuration (for production)
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
+# Messages sent per batch when emailing participants about an action update
+ACTION_UPDATE_EMAIL_BATCH_SIZE = 100
+
 # AI Service Configuration
 AI_SERVICE_URL = config('AI_SERVICE_URL', default='http://localhost:3001')
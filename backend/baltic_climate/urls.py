@@ -15,6 +15,8 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
@@ -23,4 +25,4 @@ urlpatterns = [
     path("api/auth/", include("accounts.urls")),
     path("api/climate/", include("climate_data.urls")),
     path("api/actions/", include("actions.urls")),
-]
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,88 @@
+"""Requests per second on ``map-data/`` with and without the user cache.
+
+Runs against a throwaway test database with ``--actions`` actions. The
+map payload is cached after the first request, so the difference between
+the two runs is the ``User`` lookup that ``JWTAuthentication`` performs on
+every request and ``CachedJWTAuthentication`` skips.
+
+    python benchmarks/authentication.py --requests 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "baltic_climate.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from rest_framework_simplejwt.authentication import JWTAuthentication  # noqa: E402
+from rest_framework_simplejwt.tokens import RefreshToken  # noqa: E402
+
+from accounts.authentication import CachedJWTAuthentication  # noqa: E402
+from accounts.models import User  # noqa: E402
+from actions.models import ClimateAction  # noqa: E402
+from actions.views import map_actions  # noqa: E402
+
+
+def run(client, authentication_class, requests):
+    map_actions.cls.authentication_classes = [authentication_class]
+    cache.clear()
+    client.get(reverse("map_actions"))
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        for _ in range(requests):
+            response = client.get(reverse("map_actions"))
+            assert response.status_code == 200, response.status_code
+        elapsed = time.perf_counter() - start
+    print(
+        f"{authentication_class.__name__:>24}: {requests / elapsed:8.0f} req/s, "
+        f"{len(queries) / requests:.1f} queries/request"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--actions", type=int, default=200)
+    options = parser.parse_args()
+    
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user(username="bench", email="bench@example.com", password=None)
+        start = timezone.now() + timedelta(days=7)
+        ClimateAction.objects.bulk_create(
+            ClimateAction(
+                title=f"Action {n}", description="Benchmark action", action_type="ngo_initiative",
+                location_name="Gdańsk", latitude=54.35 + n / 1000, longitude=18.65, country="Poland",
+                city="Gdańsk", start_date=start, end_date=start + timedelta(hours=2), organizer=user,
+            )
+            for n in range(options.actions)
+        )
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+        
+        original = map_actions.cls.authentication_classes
+        try:
+            run(client, JWTAuthentication, options.requests)
+            run(client, CachedJWTAuthentication, options.requests)
+        finally:
+            map_actions.cls.authentication_classes = original
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
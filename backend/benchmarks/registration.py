@@ -0,0 +1,87 @@
+"""Registration throughput when many users share an email local-part.
+
+Creates a throwaway test database holding ``--existing`` users named
+info, info1, info2, ... and then registers ``--registrations`` more
+``info@...`` users through ``UserRegistrationSerializer``. Reports the
+username lookup on its own and the full registration rate, next to the
+old probe-one-name-per-query loop.
+
+    python benchmarks/registration.py --existing 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "baltic_climate.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from accounts.models import User  # noqa: E402
+from accounts.serializers import UserRegistrationSerializer, next_free_username  # noqa: E402
+
+
+def probing_username(base):
+    """The previous allocation: one exists() query per taken name"""
+    username, counter = base, 1
+    while User.objects.filter(username=username).exists():
+        username = f"{base}{counter}"
+        counter += 1
+    return username
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--existing", type=int, default=100_000)
+    parser.add_argument("--registrations", type=int, default=20)
+    options = parser.parse_args()
+    
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        password = make_password(None)
+        User.objects.bulk_create(
+            (
+                User(username=f"info{n or ''}", email=f"info{n}@existing.example", password=password)
+                for n in range(options.existing)
+            ),
+            batch_size=5000,
+        )
+        
+        username, elapsed = timed(next_free_username, "info")
+        print(f"next_free_username: {username} in {elapsed * 1000:.2f} ms")
+        username, elapsed = timed(probing_username, "info")
+        print(f"probing loop:       {username} in {elapsed * 1000:.2f} ms")
+        
+        start = time.perf_counter()
+        for n in range(options.registrations):
+            serializer = UserRegistrationSerializer(
+                data={"email": f"info@new{n}.example", "first_name": "Info", "last_name": "Desk", "password": "s3cret-pass"}
+            )
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        elapsed = time.perf_counter() - start
+        print(
+            f"registered {options.registrations} users in {elapsed:.2f} s "
+            f"({options.registrations / elapsed:.1f}/s, password hashing included)"
+        )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Refresh-token checks per second as the blacklist grows.
+
+Fills a throwaway test database with blacklisted tokens, ``--sizes`` rows
+at a time, and after each step times ``check_blacklist()`` for clean tokens
+through the plain table lookup and through the Bloom filter. The first
+filtered check after each step includes the filter rebuild, timed
+separately. The filter is only used with a shared cache, so the
+benchmark treats its LocMemCache as one, and it builds the filter inline
+rather than on the background pool.
+
+    python benchmarks/token_refresh.py --sizes 0 100000 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "baltic_climate.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken  # noqa: E402
+from rest_framework_simplejwt.tokens import RefreshToken  # noqa: E402
+
+from accounts.models import User  # noqa: E402
+from accounts import tokens  # noqa: E402
+from accounts.tokens import FilteredRefreshToken, blacklist_filter  # noqa: E402
+
+BATCH_SIZE = 10_000
+
+
+def fill_blacklist(count):
+    expires_at = timezone.now() + timedelta(days=7)
+    for start in range(0, count, BATCH_SIZE):
+        tokens = OutstandingToken.objects.bulk_create(
+            OutstandingToken(jti=uuid.uuid4().hex, token="", expires_at=expires_at)
+            for _ in range(min(BATCH_SIZE, count - start))
+        )
+        BlacklistedToken.objects.bulk_create(BlacklistedToken(token=token) for token in tokens)
+
+
+def checks_per_second(tokens):
+    start = time.perf_counter()
+    for token in tokens:
+        token.check_blacklist()
+    return len(tokens) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 100_000, 1_000_000])
+    parser.add_argument("--checks", type=int, default=5000)
+    options = parser.parse_args()
+    
+    tokens.cache_is_shared = lambda: True
+    settings.BACKGROUND_TASKS_EAGER = True
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user(username="bench", email="bench@example.com", password=None)
+        clean = [RefreshToken.for_user(user) for _ in range(options.checks)]
+        filtered = [FilteredRefreshToken(str(token)) for token in clean]
+        
+        size = 0
+        for target in sorted(options.sizes):
+            fill_blacklist(target - size)
+            size = target
+            blacklist_filter.reset()
+            start = time.perf_counter()
+            filtered[0].check_blacklist()
+            rebuild = time.perf_counter() - start
+            print(
+                f"{size:>9} blacklisted: table {checks_per_second(clean):8.0f}/s, "
+                f"bloom filter {checks_per_second(filtered):8.0f}/s (rebuild {rebuild:.2f} s)"
+            )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()